@@ -22,13 +22,30 @@ PyInstaller.__main__.run([
     '--windowed',
     '--add-data=config.py;.',
     '--add-data=data.py;.',
+    '--add-data=dataset.py;.',
+    '--add-data=ingest.py;.',
+    '--add-data=feed.py;.',
+    '--add-data=kpi.py;.',
+    '--add-data=search.py;.',
+    '--add-data=ranking.py;.',
+    '--add-data=export.py;.',
+    '--add-data=downsample.py;.',
+    '--add-data=profiler.py;.',
+    '--add-data=engine.py;.',
+    '--add-data=query.py;.',
+    '--add-data=registry.py;.',
+    '--add-data=cache.py;.',
+    '--add-data=rollup.py;.',
+    '--add-data=hierarchy.py;.',
+    '--add-data=layout.py;.',
     '--add-data=visualization.py;.',
+    '--add-data=lib/bindings/utils.js;lib/bindings',
     '--hidden-import=streamlit',
     '--hidden-import=pandas',
     '--hidden-import=numpy',
     '--hidden-import=plotly',
-    '--hidden-import=networkx',
     '--hidden-import=pyvis',
+    '--hidden-import=pyarrow',
 ])
 
 print("Executable created in the 'dist' folder")
@@ -1,40 +1,111 @@
 
+import os
+import numpy as np
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from data import generate_partners, generate_sales, generate_activity, generate_social_activity
-from visualization import render_network_graph, display_partner_details
-from config import LEVELS, SOCIAL_METRICS, STATUS_OPTIONS, COLOR_MAP
+from registry import synthetic_dataset, directory_dataset, query_backend
+from cache import LRUCache
+from ingest import load_uploads
+from feed import ingest_drop
+from kpi import normalize_kpis
+from engine import FilterSpec, filter_mask, spec_key
+from export import EXPORT_FORMATS, EXPORT_LABELS, export_tables, exporter, bundle_exporter, file_name, mime_type
+from profiler import Profiler
+from layout import LAYOUTS, compute_layout
+from visualization import (network_view, network_html, render_network_graph, display_partner_details,
+                           create_time_series_charts)
+from config import (LEVELS, SOCIAL_METRICS, STATUS_OPTIONS, COLOR_MAP, DATASET_DIR, KPI_CACHE_SIZE,
+                    NETWORK_NODE_BUDGET, NETWORK_LAYOUT, EGO_HOPS, SEARCH_RESULTS, PROFILE_TRACE_FILE, PROFILE_LOG,
+                    SYNTHETIC_SEED, FEED_DIR)
 
 ### --- Streamlit App ---
 st.set_page_config(layout="wide", page_title="Partner Revenue & Activity Dashboard", page_icon="📊")
 st.markdown("# Partner Revenue & Activity Dashboard")
 st.markdown("This dashboard visualizes a partner hierarchy, revenue, activity data, and digital/social KPIs. Use the sidebar to filter or upload your own data.")
 
+# --- Rerun profiler ---
+if 'profiler' not in st.session_state:
+    st.session_state.profiler = Profiler()
+profiler = st.session_state.profiler
+profiler.begin(memory=st.session_state.get('profile_memory', False), trace_file=PROFILE_TRACE_FILE, log=PROFILE_LOG)
+
 # --- Data Upload or Generation ---
-uploaded = st.sidebar.file_uploader("Upload Partner Data (CSV)", type=["csv"])
-if uploaded:
-    df = pd.read_csv(uploaded)
-else:
-    if 'df' not in st.session_state:
-        st.session_state.df = generate_partners()
-    df = st.session_state.df
+profiler.stage('load_data')
+if 'kpi_cache' not in st.session_state:
+    st.session_state.kpi_cache = LRUCache(KPI_CACHE_SIZE)
+    st.session_state.layout_cache = LRUCache(KPI_CACHE_SIZE)
+    st.session_state.network_cache = LRUCache(KPI_CACHE_SIZE)
+if 'expanded_clusters' not in st.session_state:
+    st.session_state.expanded_clusters = []
+
+uploads = st.sidebar.file_uploader(
+    "Upload Data (CSV or Parquet)", type=["csv", "parquet"], accept_multiple_files=True,
+    help="Name files partners, sales, activity or social (e.g. sales.parquet); a single file of any name is "
+         "read as partners. Tables not uploaded are taken from the current dataset.")
+dataset_dir = st.sidebar.text_input("Dataset Directory (Parquet)", value=DATASET_DIR).strip()
+
+# The field's last loaded value is kept apart from the active source (dataset_dir, None for
+# synthetic data), so Regenerate is not undone by reloading an unchanged field on the next rerun
+if not dataset_dir:
+    st.session_state.dataset_dir_entered = None
+elif st.session_state.get('dataset_dir_entered') != dataset_dir:
+    # Load a dataset written by `python data.py <dir>` or Dataset.save instead of generating one in memory
+    if os.path.isdir(dataset_dir):
+        with st.spinner("Loading dataset from directory..."):
+            st.session_state.dataset = directory_dataset(dataset_dir)
+            st.session_state.dataset_dir = dataset_dir
+            st.session_state.dataset_dir_entered = dataset_dir
+            st.session_state.kpi_cache.invalidate()
+            st.session_state.layout_cache.invalidate()
+            st.session_state.network_cache.invalidate()
+            st.session_state.expanded_clusters = []
+    else:
+        st.sidebar.error(f"Dataset directory not found: {dataset_dir}")
 
-if 'sales' not in st.session_state or st.sidebar.button("Regenerate Synthetic Dataset"):
+# Sessions only hold a reference to a dataset from the process-wide registry, so every
+# session viewing the same data shares one read-only copy and what is derived from it
+if 'dataset' not in st.session_state or st.sidebar.button("Regenerate Synthetic Dataset"):
     with st.spinner("Generating synthetic data..."):
-        st.session_state.df = generate_partners()
-        df = st.session_state.df
-        st.session_state.sales = generate_sales(df)
-        st.session_state.activity = generate_activity(df)
-        st.session_state.social = generate_social_activity(df)
+        seed = SYNTHETIC_SEED if 'dataset' not in st.session_state else int(np.random.SeedSequence().entropy)
+        st.session_state.dataset = synthetic_dataset(seed)
+        st.session_state.dataset_dir = None
+        st.session_state.kpi_cache.invalidate()
+        st.session_state.layout_cache.invalidate()
+        st.session_state.network_cache.invalidate()
+        st.session_state.expanded_clusters = []
         st.success("✅ New synthetic data generated!")
 
-sales = st.session_state.sales
-activity = st.session_state.activity
-social = st.session_state.social if 'social' in st.session_state else generate_social_activity(df)
+if st.session_state.get('dataset_dir') and FEED_DIR and st.sidebar.button(
+        "Ingest New Data", help=f"Append rows newer than the last ingested date from files dropped into {FEED_DIR}"):
+    # Only the new rows are folded into the rollup and partner totals; caches follow the new fingerprint
+    with st.spinner("Appending new data..."):
+        st.session_state.dataset, results = ingest_drop(st.session_state.dataset_dir, FEED_DIR,
+                                                        st.session_state.dataset)
+    for result in results:
+        if result.problems:
+            st.sidebar.error(f"{result.file}: " + "; ".join(result.problems))
+        else:
+            st.sidebar.info(f"{result.file}: {result.appended:,} rows appended, {result.stale:,} older than the "
+                            f"last ingested day, {result.duplicates:,} already ingested")
+    if not results:
+        st.sidebar.info("No new files to ingest.")
+
+dataset = st.session_state.dataset
+if uploads:
+    # Parsed and validated once per file content; the dataset and everything derived from it is reused on reruns
+    with st.spinner("Loading uploaded data..."):
+        uploaded_dataset, problems = load_uploads(uploads, dataset)
+    for problem in problems:
+        st.sidebar.error(problem)
+    if uploaded_dataset is not None:
+        dataset = uploaded_dataset
+df = dataset.partners
+hierarchy = dataset.hierarchy
+downline = dataset.downline
 
 # --- Sidebar Filters ---
+profiler.stage('filters')
 st.sidebar.markdown("## Filters")
 
 # Level filters
@@ -47,108 +118,47 @@ selected_statuses = st.sidebar.multiselect("Filter by Status", statuses, default
 
 # Partner search functionality 
 st.sidebar.markdown("## Search")
-search_query = st.sidebar.text_input("Search Partner by Name or ID")
-partner_names = df[(df['level'].isin(selected_levels)) & 
-                   (df['status'].isin(selected_statuses))]['name'].tolist()
+search_query = st.sidebar.text_input("Search Partner by Name or ID",
+                                     help="Matches the start of ids and any part of names, and tolerates small typos")
+in_filters = filter_mask(dataset, FilterSpec(selected_levels, selected_statuses))
 
 if search_query:
-    # Filter partner list based on search
-    partner_names = [name for name in partner_names if search_query.lower() in name.lower()]
-    if len(partner_names) == 0:
+    # Ranked matches from the dataset's search index, within the level and status filters
+    candidates = dataset.search.search(search_query, SEARCH_RESULTS, in_filters)
+    if len(candidates) == 0:
         st.sidebar.warning("No partners found matching your search.")
+else:
+    candidates = np.flatnonzero(in_filters)[:SEARCH_RESULTS]
+partner_names = dict(zip(df['partner_id'].to_numpy()[candidates].tolist(), df['name'].to_numpy()[candidates]))
 
 # Partner selection
-selected_partner = st.sidebar.selectbox("Select Partner", [None] + partner_names)
-
-# Apply all filters
-filtered_df = df[df['level'].isin(selected_levels) & df['status'].isin(selected_statuses)]
-
-# If search is active, apply search filter
-if search_query and not selected_partner:
-    filtered_df = filtered_df[
-        filtered_df['name'].str.lower().str.contains(search_query.lower()) |
-        filtered_df['partner_id'].astype(str).str.contains(search_query)
-    ]
+selected_partner_id = st.sidebar.selectbox("Select Partner", [None] + list(partner_names),
+                                           format_func=lambda pid: str(partner_names.get(pid)))
+selected_partner = partner_names.get(selected_partner_id)
 
-# Filter related datasets
-filtered_sales = sales[sales['partner_id'].isin(filtered_df['partner_id'])]
-filtered_activity = activity[activity['partner_id'].isin(filtered_df['partner_id'])]
-filtered_social = social[social['partner_id'].isin(filtered_df['partner_id'])]
-
-# If a specific partner is selected
-selected_partner_id = None
-if selected_partner:
-    selected_partner_id = df[df['name'] == selected_partner]['partner_id'].values[0]
-    filtered_sales = filtered_sales[filtered_sales['partner_id'] == selected_partner_id]
-    filtered_activity = filtered_activity[filtered_activity['partner_id'] == selected_partner_id]
-    filtered_social = filtered_social[filtered_social['partner_id'] == selected_partner_id]
+# Apply all filters; an active search narrows the partners only while none is selected
+spec = FilterSpec(selected_levels, selected_statuses, search_query, selected_partner_id)
+filtered_df = df[filter_mask(dataset, spec)]
 
 # --- Summary Statistics ---
-# Revenue summary
-summary = filtered_sales.groupby('partner_id').agg({'revenue':'sum'}).reset_index().merge(
-    filtered_df[['partner_id','name','level','status']], on='partner_id')
-
-# Activity summary
-activity_summary = filtered_activity.groupby('partner_id').size().reset_index(name='activity_count').merge(
-    filtered_df[['partner_id','name','level','status']], on='partner_id')
-
-# Social metrics summary
-social_summary = filtered_social.groupby('partner_id').agg({
-    'posts': 'sum', 
-    'shares': 'sum', 
-    'sentiment': 'mean',
-    'advocacy_score': 'mean',
-    'reviews': 'sum'
-}).reset_index().merge(filtered_df[['partner_id','name','level','status']], on='partner_id')
-
-# Combined KPI summary for ranking
-kpi_summary = summary.merge(
-    activity_summary[['partner_id', 'activity_count']], 
-    on='partner_id', how='left'
-).merge(
-    social_summary[['partner_id', 'posts', 'shares', 'sentiment', 'advocacy_score', 'reviews']],
-    on='partner_id', how='left'
-).fillna(0)
-
-# Aggregate by level
-level_revenue = filtered_sales.merge(filtered_df[['partner_id','level']], on='partner_id').groupby('level')['revenue'].sum()
-level_activity = filtered_activity.merge(filtered_df[['partner_id','level']], on='partner_id').groupby('level').size()
-level_social = filtered_social.merge(filtered_df[['partner_id','level']], on='partner_id').groupby('level').agg({
-    'posts': 'sum', 
-    'shares': 'sum',
-    'advocacy_score': 'mean',
-    'sentiment': 'mean'
-})
-
-# Convert dates for time series analysis
-sales['date'] = pd.to_datetime(sales['date'])
-activity['date'] = pd.to_datetime(activity['date'])
-social['date'] = pd.to_datetime(social['date'])
-
-# Time series summaries
-revenue_time = filtered_sales.groupby('date')['revenue'].sum().reset_index()
-activity_time = filtered_activity.groupby('date').size().reset_index(name='activity_count')
-social_time = filtered_social.groupby('date').agg({
-    'posts': 'sum', 
-    'shares': 'sum',
-    'sentiment': 'mean',
-    'advocacy_score': 'mean',
-    'reviews': 'sum'
-}).reset_index()
-
-# --- Top/Bottom Performers (multiple KPIs) ---
-# Revenue
-top_revenue = kpi_summary.sort_values('revenue', ascending=False).head(5)
-bottom_revenue = kpi_summary.sort_values('revenue', ascending=True).head(5)
-
-# Activity
-top_activity = kpi_summary.sort_values('activity_count', ascending=False).head(5)
-bottom_activity = kpi_summary.sort_values('activity_count', ascending=True).head(5)
-
-# Social KPIs
-top_advocacy = kpi_summary.sort_values('advocacy_score', ascending=False).head(5)
-top_engagement = kpi_summary.sort_values('posts', ascending=False).head(5)
-top_sentiment = kpi_summary.sort_values('sentiment', ascending=False).head(5)
+profiler.stage('kpis')
+# Reuse the frames computed for this exact dataset and filter state when nothing relevant changed
+# Every backend returns the same frames, so the key does not depend on which one answers
+kpi_key = (dataset.fingerprint, spec_key(spec, dataset))
+kpis = st.session_state.kpi_cache.get_or_compute(kpi_key, lambda: query_backend(dataset).compute(spec))
+
+summary = kpis['summary']
+activity_summary = kpis['activity_summary']
+social_summary = kpis['social_summary']
+kpi_summary = kpis['kpi_summary']
+level_revenue = kpis['level_revenue']
+level_activity = kpis['level_activity']
+level_social = kpis['level_social']
+revenue_time = kpis['revenue_time']
+activity_time = kpis['activity_time']
+social_time = kpis['social_time']
+totals = kpis['totals']
+ranking = kpis['ranking']
 
 # --- Tabs for UI ---
 tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
@@ -156,6 +166,7 @@ tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
 ])
 
 # --- Tab 1: Network Graph ---
+profiler.stage('network_tab')
 with tab1:
     st.markdown("## Partner Hierarchy Network")
     st.markdown("Visualize your entire partner network as an interactive graph. Each node represents a partner, sized by revenue, colored by level.")
@@ -164,20 +175,74 @@ with tab1:
     net_cols = st.columns([3, 1])
     with net_cols[1]:
         st.markdown("### Network Controls")
+        node_budget = st.number_input("Node Budget", min_value=50, max_value=5000,
+                                      value=NETWORK_NODE_BUDGET, step=50,
+                                      help="Above this many partners, subtrees are collapsed into cluster nodes")
+        layout_options = LAYOUTS + ['physics']
+        layout = st.selectbox("Layout", layout_options, index=layout_options.index(NETWORK_LAYOUT),
+                              format_func=lambda kind: {'tiered': "Tiered by level", 'force': "Force (server)",
+                                                        'physics': "Physics (browser)"}[kind],
+                              help="Tiered and force layouts are computed once on the server and drawn without physics")
+        # Ego network: only the selected partner's upline, downline to a few levels and siblings
+        shown_df, ego = filtered_df, None
+        if selected_partner_id is not None and st.checkbox("Focus on Selected Partner", value=True):
+            hops = st.slider("Downline Levels", min_value=1, max_value=10, value=EGO_HOPS)
+            siblings = st.checkbox("Include Siblings", value=False)
+            ego = (hops, siblings)
+            shown_df = df.iloc[hierarchy.positions(hierarchy.neighborhood(selected_partner_id, hops, siblings))]
+        # The selected partner is always drawn, together with its upline
+        expanded = st.session_state.expanded_clusters + ([selected_partner_id] if selected_partner_id else [])
+        with profiler.span('network_view'):
+            view = network_view(shown_df, df, hierarchy, node_budget, expanded)
+        # Same view, same positions and page: only a change of filters, budget or clusters builds them again
+        view_key = kpi_key + (node_budget, tuple(expanded), layout, ego)
+        positions = None
+        if layout != 'physics':
+            with profiler.span('layout'):
+                positions = st.session_state.layout_cache.get_or_compute(view_key, lambda: compute_layout(view, layout))
+        with profiler.span('network_html'):
+            network_page = st.session_state.network_cache.get_or_compute(
+                view_key, lambda: network_html(view, selected_partner_id, positions))
+        clusters = view[view['cluster_size'] > 1]
+        clusters = clusters[clusters['partner_id'] > 0]
+
+        def expand_cluster():
+            choice = st.session_state.expand_cluster
+            if choice is not None:
+                st.session_state.expanded_clusters.append(choice)
+            st.session_state.expand_cluster = None
+
+        if len(clusters):
+            cluster_labels = dict(zip(clusters['partner_id'].tolist(),
+                                      [f"{name} [{size:,}]" for name, size in zip(clusters['name'], clusters['cluster_size'])]))
+            st.selectbox("Expand Cluster", [None] + list(cluster_labels), key='expand_cluster',
+                         format_func=lambda pid: "—" if pid is None else cluster_labels[pid],
+                         on_change=expand_cluster)
+        if st.session_state.expanded_clusters and st.button("Collapse All"):
+            st.session_state.expanded_clusters = []
+            st.rerun()
         st.info("👆 Click on any node to see partner details")
         st.markdown("#### Network Legend")
         for level, color in COLOR_MAP.items():
             st.markdown(f"<span style='color:{color}'>●</span> {level}", unsafe_allow_html=True)
-    
+        if len(view) < len(shown_df):
+            st.markdown("◆ cluster of partners, ■ remaining partners under one parent")
+
     with net_cols[0]:
+        if ego:
+            st.caption(f"Ego network of {selected_partner}: {len(shown_df):,} partners within "
+                       f"{ego[0]} downline level{'s' if ego[0] > 1 else ''}, ignoring the level and status filters")
+        if len(view) < len(shown_df):
+            st.caption(f"Showing {len(view):,} nodes for {len(shown_df):,} partners")
         # Render the interactive network graph
-        render_network_graph(filtered_df, selected_partner_id)
+        render_network_graph(network_page)
 
 # --- Tab 2: Partner Details ---
+profiler.stage('details_tab')
 with tab2:
     if selected_partner:
         # Show detailed partner information for the selected partner
-        display_partner_details(df, sales, activity, social, selected_partner_id)
+        display_partner_details(dataset.index, hierarchy, downline, selected_partner_id)
     else:
         st.markdown("## Partner Details")
         st.info("👈 Select a partner from the sidebar to view detailed information")
@@ -189,15 +254,16 @@ with tab2:
         st.dataframe(filtered_df[display_cols], use_container_width=True)
 
 # --- Tab 3: Dashboard ---
+profiler.stage('dashboard_tab')
 with tab3:
     st.markdown("## Revenue & Activity Overview")
     
     # Summary metrics in a single row
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Total Revenue", f"${filtered_sales['revenue'].sum():,.2f}")
-    col2.metric("Total Activities", f"{filtered_activity.shape[0]:,}")
-    col3.metric("Total Social Posts", f"{filtered_social['posts'].sum():,}")
-    col4.metric("Avg Advocacy Score", f"{filtered_social['advocacy_score'].mean():.1f}/100")
+    col1.metric("Total Revenue", f"${totals['revenue']:,.2f}")
+    col2.metric("Total Activities", f"{totals['activities']:,}")
+    col3.metric("Total Social Posts", f"{totals['posts']:,}")
+    col4.metric("Avg Advocacy Score", f"{totals['advocacy_score']:.1f}/100")
     
     # Revenue and activity by partner level
     st.markdown("### Performance by Partner Level")
@@ -212,7 +278,7 @@ with tab3:
     
     with level_cols[1]:
         st.markdown("#### Activity Count by Level")
-        fig = px.bar(level_activity.reset_index(), x='level', y=0,
+        fig = px.bar(level_activity.reset_index(), x='level', y='activity_count',
                    color='level', color_discrete_map=COLOR_MAP,
                    title='Activity Count by Partner Level')
         st.plotly_chart(fig, use_container_width=True)
@@ -222,23 +288,24 @@ with tab3:
     time_cols = st.columns(2)
     
     with time_cols[0]:
-        fig1 = px.line(revenue_time, x='date', y='revenue', title='Revenue Over Time')
+        fig1 = create_time_series_charts(revenue_time, 'date', 'revenue', 'Revenue Over Time')
         st.plotly_chart(fig1, use_container_width=True)
     
     with time_cols[1]:
-        fig2 = px.line(activity_time, x='date', y='activity_count', title='Activity Over Time')
+        fig2 = create_time_series_charts(activity_time, 'date', 'activity_count', 'Activity Over Time')
         st.plotly_chart(fig2, use_container_width=True)
 
 # --- Tab 4: Social & Digital KPIs ---
+profiler.stage('social_tab')
 with tab4:
     st.markdown("## Social & Digital KPIs Dashboard")
     
     # Social metrics summary
     social_metric_cols = st.columns(4)
-    social_metric_cols[0].metric("Total Posts", f"{filtered_social['posts'].sum():,}")
-    social_metric_cols[1].metric("Total Shares", f"{filtered_social['shares'].sum():,}")
-    social_metric_cols[2].metric("Avg Sentiment", f"{filtered_social['sentiment'].mean():.2f}")
-    social_metric_cols[3].metric("Total Reviews", f"{filtered_social['reviews'].sum():,}")
+    social_metric_cols[0].metric("Total Posts", f"{totals['posts']:,}")
+    social_metric_cols[1].metric("Total Shares", f"{totals['shares']:,}")
+    social_metric_cols[2].metric("Avg Sentiment", f"{totals['sentiment']:.2f}")
+    social_metric_cols[3].metric("Total Reviews", f"{totals['reviews']:,}")
     
     # Social metrics over time
     st.markdown("### Social Media Activity Over Time")
@@ -247,29 +314,25 @@ with tab4:
     social_time_cols = st.columns(2)
     
     with social_time_cols[0]:
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=social_time['date'], y=social_time['posts'], 
-                                mode='lines', name='Posts'))
-        fig.update_layout(title='Posts Over Time', xaxis_title='Date', yaxis_title='Count')
+        fig = create_time_series_charts(social_time, 'date', 'posts', 'Posts Over Time',
+                                        xaxis_title='Date', yaxis_title='Count')
         st.plotly_chart(fig, use_container_width=True)
     
     with social_time_cols[1]:
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=social_time['date'], y=social_time['shares'], 
-                                mode='lines', name='Shares'))
-        fig.update_layout(title='Shares Over Time', xaxis_title='Date', yaxis_title='Count')
+        fig = create_time_series_charts(social_time, 'date', 'shares', 'Shares Over Time',
+                                        xaxis_title='Date', yaxis_title='Count')
         st.plotly_chart(fig, use_container_width=True)
     
     # Sentiment and advocacy over time
     sentiment_cols = st.columns(2)
     
     with sentiment_cols[0]:
-        fig = px.line(social_time, x='date', y='sentiment', title='Average Sentiment Over Time')
+        fig = create_time_series_charts(social_time, 'date', 'sentiment', 'Average Sentiment Over Time')
         fig.add_hline(y=0, line_dash="dash", line_color="gray")
         st.plotly_chart(fig, use_container_width=True)
     
     with sentiment_cols[1]:
-        fig = px.line(social_time, x='date', y='advocacy_score', title='Average Advocacy Score Over Time')
+        fig = create_time_series_charts(social_time, 'date', 'advocacy_score', 'Average Advocacy Score Over Time')
         st.plotly_chart(fig, use_container_width=True)
     
     # Social metrics by partner level
@@ -292,11 +355,13 @@ with tab4:
         st.plotly_chart(fig, use_container_width=True)
 
 # --- Tab 5: Performance ---
+profiler.stage('performance_tab')
 with tab5:
     st.markdown("## Partner Performance Rankings")
     
     # KPI selection for ranking
-    kpi_options = ["Revenue", "Activity Count", "Posts", "Shares", "Sentiment", "Advocacy Score"]
+    kpi_options = ["Revenue", "Activity Count", "Posts", "Shares", "Sentiment", "Advocacy Score",
+                   "Downline Revenue", "Downline Size"]
     selected_kpi = st.selectbox("Select KPI to Rank Partners", kpi_options)
     
     # Map selection to dataframe column
@@ -306,7 +371,9 @@ with tab5:
         "Posts": "posts",
         "Shares": "shares",
         "Sentiment": "sentiment",
-        "Advocacy Score": "advocacy_score"
+        "Advocacy Score": "advocacy_score",
+        "Downline Revenue": "downline_revenue",
+        "Downline Size": "downline_size"
     }
     
     selected_column = kpi_column_map[selected_kpi]
@@ -316,25 +383,29 @@ with tab5:
     
     with perf_cols[0]:
         st.markdown(f"### Top 10 by {selected_kpi}")
-        top_performers = kpi_summary.sort_values(selected_column, ascending=False).head(10)
+        top_performers = ranking.top(selected_column, 10)
+        top_performers = top_performers.assign(percentile=ranking.percentile_of(selected_column, top_performers))
         
-        if selected_kpi == "Revenue":
+        if selected_kpi in ("Revenue", "Downline Revenue"):
             top_performers[selected_column] = top_performers[selected_column].map('${:,.2f}'.format)
         
         st.dataframe(
-            top_performers[['name', 'level', 'status', selected_column]], 
+            top_performers[['name', 'level', 'status', selected_column, 'percentile']],
+            column_config={'percentile': st.column_config.NumberColumn("Percentile", format="%.0f%%")},
             use_container_width=True
         )
     
     with perf_cols[1]:
         st.markdown(f"### Bottom 10 by {selected_kpi}")
-        bottom_performers = kpi_summary.sort_values(selected_column, ascending=True).head(10)
+        bottom_performers = ranking.bottom(selected_column, 10)
+        bottom_performers = bottom_performers.assign(percentile=ranking.percentile_of(selected_column, bottom_performers))
         
-        if selected_kpi == "Revenue":
+        if selected_kpi in ("Revenue", "Downline Revenue"):
             bottom_performers[selected_column] = bottom_performers[selected_column].map('${:,.2f}'.format)
         
         st.dataframe(
-            bottom_performers[['name', 'level', 'status', selected_column]], 
+            bottom_performers[['name', 'level', 'status', selected_column, 'percentile']],
+            column_config={'percentile': st.column_config.NumberColumn("Percentile", format="%.0f%%")},
             use_container_width=True
         )
     
@@ -353,22 +424,17 @@ with tab5:
         comparison_df = kpi_summary[kpi_summary['name'].isin(partners_to_compare)]
         
         # Normalize metrics for radar chart
-        metrics_to_compare = ['revenue', 'activity_count', 'posts', 'shares', 'advocacy_score']
-        normalized_df = comparison_df.copy()
-        
-        for metric in metrics_to_compare:
-            max_val = kpi_summary[metric].max() if kpi_summary[metric].max() > 0 else 1
-            normalized_df[f"{metric}_normalized"] = comparison_df[metric] / max_val * 100
+        normalized = normalize_kpis(kpi_summary, comparison_df)
         
         # Create radar chart
         fig = go.Figure()
         
-        for _, row in normalized_df.iterrows():
+        for name, values in zip(comparison_df['name'], normalized.itertuples(index=False)):
             fig.add_trace(go.Scatterpolar(
-                r=[row[f"{m}_normalized"] for m in metrics_to_compare],
+                r=list(values),
                 theta=['Revenue', 'Activity', 'Posts', 'Shares', 'Advocacy'],
                 fill='toself',
-                name=row['name']
+                name=name
             ))
         
         fig.update_layout(
@@ -382,70 +448,69 @@ with tab5:
         st.info("Select partners to compare their performance across multiple KPIs")
 
 # --- Tab 6: Export ---
+profiler.stage('export_tab')
 with tab6:
     st.markdown("## Export Summary Statistics")
     
+    # Files are only serialized when a download button is clicked
+    export_format = st.radio("Format", list(EXPORT_FORMATS), format_func=EXPORT_LABELS.get, horizontal=True)
+    
+    def export_button(label, df, name):
+        st.download_button(
+            label=label,
+            data=exporter(df, export_format),
+            file_name=file_name(name, export_format),
+            mime=mime_type(export_format),
+            on_click='ignore'
+        )
+    
     export_cols = st.columns(3)
     
     with export_cols[0]:
         st.markdown("### Revenue Data")
-        st.download_button(
-            label="Download Revenue Summary as CSV",
-            data=summary.to_csv(index=False),
-            file_name="revenue_summary.csv",
-            mime="text/csv"
-        )
+        export_button("Download Revenue Summary", summary, "revenue_summary")
     
     with export_cols[1]:
         st.markdown("### Activity Data")
-        st.download_button(
-            label="Download Activity Summary as CSV",
-            data=activity_summary.to_csv(index=False),
-            file_name="activity_summary.csv",
-            mime="text/csv"
-        )
+        export_button("Download Activity Summary", activity_summary, "activity_summary")
     
     with export_cols[2]:
         st.markdown("### Social KPI Data")
-        st.download_button(
-            label="Download Social KPI Summary as CSV",
-            data=social_summary.to_csv(index=False),
-            file_name="social_summary.csv",
-            mime="text/csv"
-        )
+        export_button("Download Social KPI Summary", social_summary, "social_summary")
     
     # Combined export
     st.markdown("### Complete Partner Performance Data")
-    st.download_button(
-        label="Download Complete KPI Dataset as CSV",
-        data=kpi_summary.to_csv(index=False),
-        file_name="partner_complete_kpi_summary.csv",
-        mime="text/csv"
-    )
+    export_button("Download Complete KPI Dataset", kpi_summary, "partner_complete_kpi_summary")
     
     # Time series exports
     time_export_cols = st.columns(3)
     
     with time_export_cols[0]:
-        st.download_button(
-            label="Download Revenue Time Series",
-            data=revenue_time.to_csv(index=False),
-            file_name="revenue_time_series.csv",
-            mime="text/csv"
-        )
+        export_button("Download Revenue Time Series", revenue_time, "revenue_time_series")
     
     with time_export_cols[1]:
-        st.download_button(
-            label="Download Activity Time Series",
-            data=activity_time.to_csv(index=False),
-            file_name="activity_time_series.csv",
-            mime="text/csv"
-        )
+        export_button("Download Activity Time Series", activity_time, "activity_time_series")
     
     with time_export_cols[2]:
-        st.download_button(
-            label="Download Social Time Series",
-            data=social_time.to_csv(index=False),
-            file_name="social_time_series.csv",
-            mime="text/csv"
-        )
\ No newline at end of file
+        export_button("Download Social Time Series", social_time, "social_time_series")
+    
+    # Every table above in one archive
+    st.markdown("### All Tables")
+    st.download_button(
+        label="Download All Tables (.zip)",
+        data=bundle_exporter(export_tables(kpis), export_format),
+        file_name=f"partner_dashboard_{export_format.replace('.', '_')}.zip",
+        mime="application/zip",
+        on_click='ignore'
+    )
+
+# --- Timings ---
+profiler.end()
+if st.sidebar.checkbox("Show Timings", key='show_timings', help="Time spent in each stage of the last reruns"):
+    st.sidebar.checkbox("Track Memory", key='profile_memory',
+                        help="Record memory deltas per stage with tracemalloc from the next rerun; slows reruns down")
+    st.sidebar.caption(f"Rerun {profiler.count}: {profiler.reruns[-1]['rerun'] * 1000:,.0f} ms. "
+                       f"Percentiles over the last {len(profiler.reruns)} reruns.")
+    st.sidebar.dataframe(profiler.summary().round(1), hide_index=True, use_container_width=True)
+    with st.sidebar.expander("Last Rerun Spans"):
+        st.dataframe(profiler.last().round(4), hide_index=True, use_container_width=True)
@@ -0,0 +1,109 @@
+"""Check that every query backend returns the same KPI frames, and time them.
+
+Each backend answers the same filter specs over one synthetic dataset. Frames
+are compared with the pandas backend's (floats to a relative 1e-9, since SQL
+sums in a different order), then every spec is timed. Run from the
+repository root:
+
+    python benchmarks/backends.py                        # 1k and 10k partners
+    python benchmarks/backends.py --sizes 100000 --backends pandas duckdb
+
+Exits with status 1 when a backend's frames differ. DuckDB is skipped when it
+is not installed.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+from data import generate_partners, generate_sales, generate_activity, generate_social_activity
+from dataset import Dataset
+from engine import FilterSpec
+from query import BACKENDS, EXTENSIONS, open_backend
+
+SIZES = [1000, 10_000]
+# Given to one partner, so a search past the name's indexed prefix is checked too
+LONG_NAME = 'Northwind Trading Company Holdings Limited - Southwest Region Office'
+
+def specs(dataset):
+    """Filter specs covering each kind of filter the sidebar sets"""
+    partners = dataset.partners
+    middle = int(partners['partner_id'].iloc[len(partners) // 2])
+    return {
+        'all partners': FilterSpec(),
+        'level + status': FilterSpec(['Agent', 'Ambassador'], ['Active', 'Premium']),
+        'name substring': FilterSpec(search='partner 1'),
+        'id prefix': FilterSpec(search=str(middle)[:2]),
+        'typo': FilterSpec(search=f"partnr {middle}"),
+        'long name': FilterSpec(search='southwest region'),
+        'one partner': FilterSpec(partner_id=middle),
+        'no level': FilterSpec(levels=[]),
+    }
+
+def differences(expected, actual):
+    """Names of the KPI frames in actual that do not match expected"""
+    different = []
+    for name, value in expected.items():
+        try:
+            if name == 'ranking':
+                continue
+            if name == 'totals':
+                assert all(np.isclose(value[key], actual[name][key], rtol=1e-9, equal_nan=True) for key in value)
+            elif isinstance(value, pd.Series):
+                pd.testing.assert_series_equal(value, actual[name], rtol=1e-9)
+            else:
+                pd.testing.assert_frame_equal(value, actual[name], rtol=1e-9)
+        except AssertionError:
+            different.append(name)
+    return different
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(size, backends, repeat, directory):
+    partners = generate_partners(size, seed=0)
+    partners.loc[len(partners) // 3, 'name'] = LONG_NAME
+    dataset = Dataset(partners, generate_sales(partners, seed=0), generate_activity(partners, seed=0),
+                      generate_social_activity(partners, seed=0))
+    dataset.rollup, dataset.partner_kpis, dataset.downline, dataset.index
+    cases = specs(dataset)
+    reference = open_backend(dataset)
+    expected = {case: reference.compute(spec) for case, spec in cases.items()}
+    failed = False
+    for name in backends:
+        start = time.perf_counter()
+        backend = open_backend(dataset, name, os.path.join(directory, f"{size}{EXTENSIONS.get(name, '')}"))
+        built = time.perf_counter() - start
+        print(f"\n{name} at {size:,} partners" + (f" (database built in {built:.2f} s)" if name != 'pandas' else ''))
+        for case, spec in cases.items():
+            different = differences(expected[case], backend.compute(spec))
+            failed |= bool(different)
+            seconds = best_time(lambda: backend.compute(spec), repeat)
+            status = 'ok' if not different else 'DIFFERS: ' + ', '.join(different)
+            print(f"{case:>16} {seconds * 1000:>10.1f} ms  {status}")
+    return failed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the query backends' KPI frames and latency.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="partner counts to run")
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, help="backends to run (default: all installed)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per spec")
+    args = parser.parse_args()
+
+    backends = args.backends or [name for name in BACKENDS
+                                 if name != 'duckdb' or importlib.util.find_spec('duckdb') is not None]
+    with tempfile.TemporaryDirectory() as directory:
+        failed = [run(size, backends, args.repeat, directory) for size in args.sizes]
+    sys.exit(1 if any(failed) else 0)
@@ -0,0 +1,34 @@
+"""Time network graph construction for growing partner counts.
+
+Run from the repository root:
+
+    python benchmarks/network_build.py [sizes...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import generate_partners
+from visualization import build_network
+
+def time_network_build(num_partners, repeat=3):
+    """Best-of-repeat seconds to build the network and to render its HTML"""
+    partners = generate_partners(num_partners, seed=0)
+    build, render = float('inf'), float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        net = build_network(partners)
+        built = time.perf_counter()
+        net.generate_html()
+        build = min(build, built - start)
+        render = min(render, time.perf_counter() - built)
+    return build, render
+
+if __name__ == '__main__':
+    sizes = [int(size) for size in sys.argv[1:]] or [1000, 10000, 50000]
+    print(f"{'partners':>10} {'build (s)':>10} {'html (s)':>10}")
+    for size in sizes:
+        build, render = time_network_build(size)
+        print(f"{size:>10,} {build:>10.3f} {render:>10.3f}")
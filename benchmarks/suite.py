@@ -0,0 +1,167 @@
+"""Headless benchmark suite: data generation, KPI aggregation, network HTML and partner details.
+
+Every case is timed at each partner count and reported with its peak memory,
+as JSON that can be kept per commit and compared. Run from the repository root:
+
+    python benchmarks/suite.py                          # 30, 1k, 10k and 100k partners
+    python benchmarks/suite.py --sizes 30 1000 --repeat 5 --output before.json
+    python benchmarks/suite.py --compare before.json    # print the change against an earlier run
+
+Timings are the best, median and mean of --repeat runs. Peak memory comes from
+one extra run under tracemalloc, kept apart because tracing slows Python code
+down; it counts the allocations of Python, numpy and pandas.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+from data import generate_partners, generate_sales, generate_activity, generate_social_activity
+from dataset import Dataset
+from kpi import compute_kpis
+from layout import compute_layout
+from visualization import network_view, network_html
+from config import NETWORK_NODE_BUDGET, NETWORK_LAYOUT
+
+SIZES = [30, 1000, 10_000, 100_000]
+# Partners whose details are looked up per detail-slicing run
+DETAIL_SAMPLE = 100
+
+def partner_details(dataset, partner_id):
+    """The lookups display_partner_details makes for one partner, without drawing anything"""
+    index, hierarchy = dataset.index, dataset.hierarchy
+    partner = index['partners'].rows(partner_id).iloc[0]
+    days = index['rollup'].rows(partner_id)
+    index['sales'].rows(partner_id).sort_values('date', ascending=False).head(10)
+    index['activity'].rows(partner_id).sort_values('date', ascending=False).head(10)
+    index['social'].rows(partner_id)
+    days.loc[days['sales_count'] > 0, ['date', 'revenue']]
+    dataset.downline.loc[partner_id]
+    index['partners'].rows_for(hierarchy.ancestors(partner_id))
+    index['partners'].rows_for(hierarchy.children(partner_id))
+    return partner
+
+def cases(num_partners, seed=0):
+    """(name, callable) pairs for one partner count; setup happens here and is not timed"""
+    partners = generate_partners(num_partners, seed=seed)
+    tables = dict(partners=partners, sales=generate_sales(partners, seed=seed),
+                  activity=generate_activity(partners, seed=seed),
+                  social=generate_social_activity(partners, seed=seed))
+    dataset = Dataset(**tables)
+    # Warm the per-dataset caches the app keeps between reruns
+    dataset.rollup, dataset.partner_kpis, dataset.downline, dataset.index
+    df = dataset.partners
+    sample = np.random.default_rng(seed).choice(df['partner_id'].to_numpy(), min(DETAIL_SAMPLE, len(df)), replace=False)
+
+    def prepare_dataset():
+        fresh = Dataset(**tables)
+        fresh.rollup, fresh.partner_kpis, fresh.downline, fresh.index
+
+    def network():
+        view = network_view(df, df, dataset.hierarchy, NETWORK_NODE_BUDGET)
+        return network_html(view, None, compute_layout(view, NETWORK_LAYOUT))
+
+    return [
+        ('generate_partners', lambda: generate_partners(num_partners, seed=seed)),
+        ('generate_sales', lambda: generate_sales(partners, seed=seed)),
+        ('generate_activity', lambda: generate_activity(partners, seed=seed)),
+        ('generate_social_activity', lambda: generate_social_activity(partners, seed=seed)),
+        ('prepare_dataset', prepare_dataset),
+        ('compute_kpis', lambda: compute_kpis(df, dataset.rollup, dataset.partner_kpis, None,
+                                              dataset.index['rollup'], dataset.downline)),
+        ('network_html', network),
+        ('partner_details', lambda: [partner_details(dataset, partner_id) for partner_id in sample.tolist()]),
+    ]
+
+def measure(fn, repeat):
+    """Wall-clock seconds of repeat runs and the peak traced memory of one more"""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def run(sizes, repeat, only=None):
+    results = []
+    for size in sizes:
+        for name, fn in cases(size):
+            if only and name not in only:
+                continue
+            seconds, peak = measure(fn, repeat)
+            results.append({
+                'case': name,
+                'partners': size,
+                'min_s': min(seconds),
+                'median_s': statistics.median(seconds),
+                'mean_s': statistics.fmean(seconds),
+                'runs': len(seconds),
+                'peak_memory_bytes': peak,
+            })
+            print(f"{name:>26} {size:>9,} {min(seconds):>10.4f} s {peak / 2**20:>10.1f} MB", flush=True)
+    return results
+
+def compare(results, baseline):
+    """Print the change in best time and peak memory against an earlier results file"""
+    before = {(row['case'], row['partners']): row for row in baseline['results']}
+    print(f"\nAgainst {baseline['environment'].get('commit') or 'baseline'}:")
+    print(f"{'case':>26} {'partners':>9} {'time':>9} {'memory':>9}")
+    for row in results:
+        old = before.get((row['case'], row['partners']))
+        if old is None:
+            continue
+        time_ratio = row['min_s'] / old['min_s'] if old['min_s'] else float('nan')
+        memory_ratio = row['peak_memory_bytes'] / old['peak_memory_bytes'] if old['peak_memory_bytes'] else float('nan')
+        print(f"{row['case']:>26} {row['partners']:>9,} {time_ratio:>8.2f}x {memory_ratio:>8.2f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the dashboard's data and rendering paths.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="partner counts to run")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case")
+    parser.add_argument('--cases', nargs='+', help="only run these cases")
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results.json'),
+                        help="where to write the JSON results")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    print(f"{'case':>26} {'partners':>9} {'best':>12} {'peak memory':>13}")
+    results = run(args.sizes, args.repeat, args.cases)
+    with open(args.output, 'w') as out:
+        json.dump({'environment': environment(), 'repeat': args.repeat, 'results': results}, out, indent=2)
+    print(f"\nWrote {args.output}")
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
@@ -0,0 +1,66 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+def frame_fingerprint(*frames):
+    """Content hash of one or more DataFrames, stable across processes"""
+    digest = hashlib.blake2b(digest_size=16)
+    for df in frames:
+        digest.update(repr([(column, str(dtype)) for column, dtype in df.dtypes.items()]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+class LRUCache:
+    """Mapping that keeps at most maxsize entries, evicting the least recently used.
+
+    Every operation holds a lock, so one cache can be shared by the threads of
+    all sessions. compute() in get_or_compute runs outside it, so two threads
+    missing the same key at once may both compute it.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, self._MISSING)
+            if value is self._MISSING:
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, calling compute() and storing it on a miss"""
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = self.put(key, compute())
+        return value
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or only the entries whose key matches predicate"""
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if predicate(key)]:
+                    del self._entries[key]
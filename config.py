@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 COLOR_MAP = {
     'Distributor': '#1f77b4',
     'Agent': '#2ca02c',
@@ -15,3 +18,57 @@ STATUS_OPTIONS = ['Active', 'Pending', 'Inactive', 'Premium']
 # Sentiment score ranges
 SENTIMENT_MIN = -1.0
 SENTIMENT_MAX = 1.0
+
+# Optional directory of Parquet files written by `python data.py <dir>`
+DATASET_DIR = os.environ.get('RPA_DATASET_DIR', '')
+
+# Product catalogue used by the synthetic sales generator
+PRODUCTS = [f"Product-{i}" for i in range(1, 11)]
+
+# Number of filter combinations whose KPI frames are kept per session
+KPI_CACHE_SIZE = 32
+
+# Nodes drawn on the network tab before subtrees are collapsed into clusters
+NETWORK_NODE_BUDGET = 500
+
+# Default network layout: 'tiered' or 'force' are computed on the server, 'physics' runs in the browser
+NETWORK_LAYOUT = 'tiered'
+
+# Downline levels shown around the selected partner in the network's focus mode
+EGO_HOPS = 2
+
+# Number of parsed uploads and assembled upload datasets kept in memory
+INGEST_CACHE_SIZE = 8
+
+# Partners offered in the sidebar's Select Partner list
+SEARCH_RESULTS = 100
+
+# Rows serialized at a time when writing CSV and Parquet exports
+EXPORT_CHUNK_ROWS = 100_000
+
+# Points drawn per time-series trace; longer series are downsampled (see downsample.py)
+CHART_POINT_BUDGET = 1000
+# Figures drawing more points than this use WebGL traces instead of SVG
+WEBGL_THRESHOLD = 1000
+
+# Rerun profiler: reruns kept per session for the sidebar timing panel, an optional
+# JSONL trace file every rerun is appended to, and whether reruns are logged
+PROFILE_HISTORY = 200
+PROFILE_TRACE_FILE = os.environ.get('RPA_PROFILE_TRACE', '')
+PROFILE_LOG = os.environ.get('RPA_PROFILE_LOG', '') == '1'
+
+# Datasets kept by the process-wide registry and shared by every session, the seed of
+# the default synthetic dataset, and where shared datasets are memory-mapped from
+# (set RPA_ARROW_CACHE to an empty string to keep them in memory instead)
+DATASET_REGISTRY_SIZE = 4
+SYNTHETIC_SEED = 0
+ARROW_CACHE_DIR = os.environ.get('RPA_ARROW_CACHE', os.path.join(tempfile.gettempdir(), 'partner-dashboard-arrow'))
+
+# Where the dashboard's KPI queries run: 'pandas' (in memory), or 'sqlite' or 'duckdb' to run
+# them as SQL against a database file per dataset, written once under QUERY_DB_DIR (see query.py)
+QUERY_BACKEND = os.environ.get('RPA_QUERY_BACKEND', 'pandas')
+QUERY_DB_DIR = os.environ.get('RPA_QUERY_DB', os.path.join(tempfile.gettempdir(), 'partner-dashboard-sql'))
+
+# Optional file-drop directory new sales, activity and social files arrive in; the sidebar's
+# Ingest New Data appends their rows to the loaded dataset directory (see feed.py)
+FEED_DIR = os.environ.get('RPA_FEED_DIR', '')
@@ -1,116 +1,303 @@
+import os
+import shutil
+from collections import deque
 import pandas as pd
 import numpy as np
-import random
-from datetime import datetime, timedelta
-from config import LEVELS, STATUS_OPTIONS, ACTIVITY_TYPES, SENTIMENT_MIN, SENTIMENT_MAX, SOCIAL_METRICS
-
-def generate_partners(num_partners=30):
-    data = []
-    data.append({
-        'partner_id': 1,
-        'name': 'Root Distributor',
-        'level': 'Distributor',
-        'parent_id': None,
-        'join_date': (datetime.now() - timedelta(days=random.randint(100, 1000))).strftime('%Y-%m-%d'),
-        'status': random.choice(STATUS_OPTIONS),
-        'posts': random.randint(10, 200),
-        'shares': random.randint(20, 500),
-        'sentiment': round(random.uniform(SENTIMENT_MIN, SENTIMENT_MAX), 2),
-        'advocacy_score': random.randint(1, 100),
-        'engagement': random.randint(1, 100),
-        'total_revenue': round(random.uniform(10000, 100000), 2)
+from datetime import datetime
+from config import LEVELS, STATUS_OPTIONS, ACTIVITY_TYPES, PRODUCTS, SENTIMENT_MIN, SENTIMENT_MAX, SOCIAL_METRICS
+
+# Label table drawn from by index instead of formatting one string per row
+_TRANSACTION_IDS = np.array([f"TX-{i}" for i in range(10000, 100000)], dtype=object)
+
+def _rng(seed=None):
+    """Return a NumPy Generator from a seed, an existing Generator or None"""
+    return np.random.default_rng(seed)
+
+def _dates(days_ago):
+    """Turn day offsets back from today into datetime64 dates without a per-row strftime"""
+    today = np.datetime64(datetime.now().date(), 'D')
+    return (today - np.asarray(days_ago)).astype('datetime64[ns]')
+
+def _categorical(codes, categories):
+    """Build a categorical column straight from integer codes"""
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+def generate_partners(num_partners=30, seed=None):
+    """Generate a partner hierarchy in near-linear time.
+
+    Partners are created in id order and each non-root partner is attached to a
+    uniformly chosen earlier partner of a higher level (Distributors attach to the
+    root), matching the original sequential algorithm without its O(n^2) scan.
+    """
+    rng = _rng(seed)
+    n = max(int(num_partners), 1)
+    level_codes = np.zeros(n, dtype=np.int8)
+    level_codes[1:] = rng.choice(len(LEVELS), size=n - 1, p=[0.2, 0.5, 0.3])
+
+    # Positions of candidate parents; searchsorted counts those created before each partner
+    positions = np.arange(n)
+    parent_pos = np.zeros(n, dtype=np.int64)
+    u = rng.random(n)
+    for code in range(1, len(LEVELS)):
+        members = positions[level_codes == code]
+        candidates = positions[level_codes < code]
+        counts = np.searchsorted(candidates, members)
+        parent_pos[members] = candidates[(u[members] * counts).astype(np.int64)]
+
+    partner_ids = (positions + 1).astype(np.int32)
+    parent_ids = pd.array(parent_pos + 1, dtype='Int32')
+    parent_ids[0] = pd.NA
+
+    days_ago = rng.integers(1, 901, size=n)
+    days_ago[0] = rng.integers(100, 1001)
+    posts = rng.integers(0, 201, size=n)
+    posts[0] = rng.integers(10, 201)
+    shares = rng.integers(0, 501, size=n)
+    shares[0] = rng.integers(20, 501)
+    total_revenue = rng.uniform(1000, 50000, size=n)
+    total_revenue[0] = rng.uniform(10000, 100000)
+
+    names = np.char.add('Partner ', partner_ids.astype(str)).astype(object)
+    names[0] = 'Root Distributor'
+
+    return pd.DataFrame({
+        'partner_id': partner_ids,
+        'name': names,
+        'level': _categorical(level_codes, LEVELS),
+        'parent_id': parent_ids,
+        'join_date': _dates(days_ago),
+        'status': _categorical(rng.integers(0, len(STATUS_OPTIONS), size=n), STATUS_OPTIONS),
+        'posts': posts.astype(np.int32),
+        'shares': shares.astype(np.int32),
+        'sentiment': rng.uniform(SENTIMENT_MIN, SENTIMENT_MAX, size=n).round(2),
+        'advocacy_score': rng.integers(1, 101, size=n, dtype=np.int32),
+        'engagement': rng.integers(1, 101, size=n, dtype=np.int32),
+        'total_revenue': total_revenue.round(2)
     })
-    for i in range(2, num_partners + 1):
-        level = random.choices(LEVELS, weights=[0.2, 0.5, 0.3])[0]
-        parent_candidates = [d for d in data if LEVELS.index(d['level']) < LEVELS.index(level)]
-        parent = random.choice(parent_candidates) if parent_candidates else data[0]
-        data.append({
-            'partner_id': i,
-            'name': f'Partner {i}',
-            'level': level,
-            'parent_id': parent['partner_id'],
-            'join_date': (datetime.now() - timedelta(days=random.randint(1, 900))).strftime('%Y-%m-%d'),
-            'status': random.choice(STATUS_OPTIONS),
-            'posts': random.randint(0, 200),
-            'shares': random.randint(0, 500),
-            'sentiment': round(random.uniform(SENTIMENT_MIN, SENTIMENT_MAX), 2),
-            'advocacy_score': random.randint(1, 100),
-            'engagement': random.randint(1, 100),
-            'total_revenue': round(random.uniform(1000, 50000), 2)
-        })
-    return pd.DataFrame(data)
-
-def generate_sales(partners, num_days=90):
-    sales = []
-    for _, p in partners.iterrows():
-        # Generate a realistic sales pattern over time
-        num_transactions = random.randint(10, 60)  # More transactions for longer time period
-        for _ in range(num_transactions):
-            date = datetime.now() - timedelta(days=random.randint(0, num_days))
-            revenue = round(random.uniform(100, 2000), 2)
-            # Add transaction ID and product info for more detailed reporting
-            sales.append({
-                'partner_id': p['partner_id'],
-                'date': date.strftime('%Y-%m-%d'),
-                'revenue': revenue,
-                'transaction_id': f"TX-{random.randint(10000, 99999)}",
-                'product': f"Product-{random.randint(1, 10)}"
-            })
-    return pd.DataFrame(sales)
-
-def generate_activity(partners, num_days=90):
-    activity = []
-    for _, p in partners.iterrows():
-        # Generate more activity data with varied types
-        for _ in range(random.randint(20, 100)):
-            date = datetime.now() - timedelta(days=random.randint(0, num_days))
-            activity_type = random.choice(ACTIVITY_TYPES)
-            activity.append({
-                'partner_id': p['partner_id'],
-                'date': date.strftime('%Y-%m-%d'),
-                'activity_type': activity_type,
-                'duration_minutes': random.randint(5, 120) if activity_type in ['Call', 'Meeting', 'Training'] else None
-            })
-    return pd.DataFrame(activity)
-
-def generate_social_activity(partners, num_days=90):
+
+def generate_sales(partners, num_days=90, seed=None):
+    """Generate 10-60 sales transactions per partner, drawn as whole arrays"""
+    rng = _rng(seed)
+    partner_ids = partners['partner_id'].to_numpy()
+    # Generate a realistic sales pattern over time
+    counts = rng.integers(10, 61, size=len(partner_ids))
+    total = int(counts.sum())
+    return pd.DataFrame({
+        'partner_id': np.repeat(partner_ids, counts),
+        'date': _dates(rng.integers(0, num_days + 1, size=total)),
+        'revenue': rng.uniform(100, 2000, size=total).round(2),
+        # Add transaction ID and product info for more detailed reporting
+        'transaction_id': _TRANSACTION_IDS[rng.integers(0, len(_TRANSACTION_IDS), size=total)],
+        'product': _categorical(rng.integers(0, len(PRODUCTS), size=total), PRODUCTS)
+    })
+
+def generate_activity(partners, num_days=90, seed=None):
+    """Generate 20-100 activities per partner, drawn as whole arrays"""
+    rng = _rng(seed)
+    partner_ids = partners['partner_id'].to_numpy()
+    counts = rng.integers(20, 101, size=len(partner_ids))
+    total = int(counts.sum())
+    type_codes = rng.integers(0, len(ACTIVITY_TYPES), size=total)
+    # Only calls, meetings and trainings have a duration
+    timed = np.isin(type_codes, [ACTIVITY_TYPES.index(t) for t in ['Call', 'Meeting', 'Training']])
+    duration = np.where(timed, rng.integers(5, 121, size=total), np.nan).astype(np.float32)
+    return pd.DataFrame({
+        'partner_id': np.repeat(partner_ids, counts),
+        'date': _dates(rng.integers(0, num_days + 1, size=total)),
+        'activity_type': _categorical(type_codes, ACTIVITY_TYPES),
+        'duration_minutes': duration
+    })
+
+def generate_social_activity(partners, num_days=90, seed=None):
     """Generate daily social media and digital engagement metrics for each partner"""
-    social_data = []
-    
-    # Generate daily data for each partner
-    for _, p in partners.iterrows():
-        # Set base metrics for this partner (some partners are more active than others)
-        base_posts = random.randint(0, 3)
-        base_shares = random.randint(0, 5)
-        base_sentiment_trend = random.uniform(-0.01, 0.01)  # Slight trend up or down
-        base_advocacy = random.randint(30, 80)
-        
-        # Generate daily metrics with realistic patterns
-        for day in range(num_days):
-            date = datetime.now() - timedelta(days=num_days-day)
-            
-            # Add some randomness but maintain a pattern
-            posts = max(0, int(np.random.poisson(base_posts)))
-            shares = max(0, int(np.random.poisson(base_shares)))
-            
-            # Sentiment fluctuates but follows a trend
-            sentiment = min(SENTIMENT_MAX, max(SENTIMENT_MIN, 
-                        p['sentiment'] + (base_sentiment_trend * day/10) + random.uniform(-0.1, 0.1)))
-                        
-            # Advocacy score changes more slowly
-            advocacy_score = min(100, max(1, base_advocacy + random.randint(-2, 2)))
-            
-            # Reviews are less frequent
-            reviews = 1 if random.random() < 0.1 else 0
-            
-            social_data.append({
-                'partner_id': p['partner_id'],
-                'date': date.strftime('%Y-%m-%d'),
-                'posts': posts,
-                'shares': shares,
-                'sentiment': round(sentiment, 2),
-                'advocacy_score': advocacy_score,
-                'reviews': reviews
-            })
-    
-    return pd.DataFrame(social_data)
+    rng = _rng(seed)
+    partner_ids = partners['partner_id'].to_numpy()
+    n = len(partner_ids)
+
+    # Set base metrics for each partner (some partners are more active than others)
+    base_posts = rng.integers(0, 4, size=n)
+    base_shares = rng.integers(0, 6, size=n)
+    base_sentiment_trend = rng.uniform(-0.01, 0.01, size=n)  # Slight trend up or down
+    base_advocacy = rng.integers(30, 81, size=n)
+
+    # One row per partner per day, partner-major like the original loop
+    day = np.tile(np.arange(num_days), n)
+    total = n * num_days
+
+    # Sentiment fluctuates but follows a trend
+    sentiment = (np.repeat(partners['sentiment'].to_numpy(dtype=float), num_days)
+                 + np.repeat(base_sentiment_trend, num_days) * day / 10
+                 + rng.uniform(-0.1, 0.1, size=total))
+
+    return pd.DataFrame({
+        'partner_id': np.repeat(partner_ids, num_days),
+        'date': _dates(num_days - day),
+        'posts': rng.poisson(np.repeat(base_posts, num_days)).astype(np.int32),
+        'shares': rng.poisson(np.repeat(base_shares, num_days)).astype(np.int32),
+        'sentiment': np.clip(sentiment, SENTIMENT_MIN, SENTIMENT_MAX).round(2),
+        # Advocacy score changes more slowly
+        'advocacy_score': np.clip(np.repeat(base_advocacy, num_days) + rng.integers(-2, 3, size=total), 1, 100).astype(np.int32),
+        # Reviews are less frequent
+        'reviews': (rng.random(total) < 0.1).astype(np.int32)
+    })
+
+# --- Out-of-core generation ---
+FACT_TABLES = {
+    'sales': generate_sales,
+    'activity': generate_activity,
+    'social': generate_social_activity,
+}
+
+def _seed_sequence(seed=None):
+    """Return a SeedSequence from an int, a SeedSequence, a Generator or None"""
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        seed = int(seed.integers(2**63))
+    return np.random.SeedSequence(seed)
+
+def _children(seed_sequence, count):
+    """The first count children of a SeedSequence, without spawning them.
+
+    SeedSequence.spawn advances the parent, so spawning twice from the same
+    sequence yields different children; these are always the ones a fresh
+    sequence would spawn.
+    """
+    return [np.random.SeedSequence(seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + (i,),
+                                   pool_size=seed_sequence.pool_size) for i in range(count)]
+
+def _shard_seeds(partners, table, shard_size, seed):
+    """Child seed of every shard of a fact table, fixed by the seed, table and shard position"""
+    num_shards = max(1, -(-len(partners) // shard_size))
+    table_seed = _children(_seed_sequence(seed), len(FACT_TABLES))[list(FACT_TABLES).index(table)]
+    return _children(table_seed, num_shards)
+
+def _fact_shard(table, chunk, num_days, child):
+    return FACT_TABLES[table](chunk, num_days=num_days, seed=np.random.default_rng(child))
+
+def _in_pool(function, tasks, workers):
+    """Yield function(*task) for every task in order, running at most 2 * workers ahead in a process pool"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(function, *task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def iter_fact_shards(partners, table, num_days=90, shard_size=10000, seed=None, workers=None):
+    """Yield one fact table shard at a time for consecutive slices of partners.
+
+    Every shard gets its own child seed, so a shard's rows depend only on the seed,
+    the shard size and the shard position. With workers above 1 the shards are
+    generated in a pool of that many processes and still come out in order, so
+    the output is the same for any worker count.
+    """
+    tasks = ((table, partners.iloc[shard * shard_size:(shard + 1) * shard_size], num_days, child)
+             for shard, child in enumerate(_shard_seeds(partners, table, shard_size, seed)))
+    if not workers or workers <= 1:
+        for task in tasks:
+            yield _fact_shard(*task)
+    else:
+        yield from _in_pool(_fact_shard, tasks, workers)
+
+def generate_dataset(num_partners=30, num_days=90, shard_size=10000, seed=None, workers=None):
+    """Generate partners and their three fact tables in memory, sharded like write_parquet_dataset.
+
+    Returns the four tables as (partners, sales, activity, social), the same
+    rows write_parquet_dataset writes for these arguments. workers spreads the
+    shards over a process pool (see iter_fact_shards).
+    """
+    seeds = _children(_seed_sequence(seed), 2)
+    partners = generate_partners(num_partners, seed=np.random.default_rng(seeds[0]))
+    facts = [pd.concat(iter_fact_shards(partners, table, num_days, shard_size, seeds[1], workers), ignore_index=True)
+             for table in FACT_TABLES]
+    return (partners, *facts)
+
+def _write_fact_shard(path, table, chunk, num_days, child, schema):
+    """Generate one shard and write it to its own file; runs in a pool worker"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = _fact_shard(table, chunk, num_days, child)
+    pq.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False), path)
+    return len(df)
+
+def write_parquet_dataset(out_dir, num_partners=30, num_days=90, shard_size=10000,
+                          partition_by='partner', seed=None, workers=None):
+    """Stream a synthetic dataset to a directory of Parquet files.
+
+    The partners table is written to ``partners.parquet``. Each fact table is
+    generated shard by shard and appended to ``<table>/`` either as files holding
+    contiguous partner ranges (``partition_by='partner'``) or as a Hive-style
+    ``date=YYYY-MM-DD`` layout (``partition_by='date'``). Peak memory is bounded by
+    one shard of one table rather than by the total output size.
+
+    With workers above 1, shards are generated in a pool of that many processes.
+    Partitioned by partner, each worker writes its shards straight to their own
+    ``part-<shard>.parquet`` files; partitioned by date, the shards are written
+    in order as they come back. Either way the rows do not depend on the number
+    of workers.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if partition_by not in ('partner', 'date'):
+        raise ValueError("partition_by must be 'partner' or 'date'")
+
+    seeds = _children(_seed_sequence(seed), 2)
+    os.makedirs(out_dir, exist_ok=True)
+    partners = generate_partners(num_partners, seed=np.random.default_rng(seeds[0]))
+    partners.to_parquet(os.path.join(out_dir, 'partners.parquet'), index=False)
+
+    for table in FACT_TABLES:
+        schema = pa.Schema.from_pandas(FACT_TABLES[table](partners.head(1), num_days=num_days),
+                                       preserve_index=False)
+        if partition_by == 'date':
+            # Partition on calendar days so directories read date=YYYY-MM-DD
+            schema = schema.set(schema.get_field_index('date'), pa.field('date', pa.date32()))
+        if workers and workers > 1 and partition_by == 'partner':
+            # Workers write their shards themselves; only partner slices and seeds cross processes
+            table_dir = os.path.join(out_dir, table)
+            shutil.rmtree(table_dir, ignore_errors=True)
+            os.makedirs(table_dir)
+            shard_seeds = _shard_seeds(partners, table, shard_size, seeds[1])
+            digits = len(str(len(shard_seeds) - 1))
+            tasks = ((os.path.join(table_dir, f'part-{shard:0{digits}d}.parquet'), table,
+                      partners.iloc[shard * shard_size:(shard + 1) * shard_size], num_days, child, schema)
+                     for shard, child in enumerate(shard_seeds))
+            for _ in _in_pool(_write_fact_shard, tasks, workers):
+                pass
+            continue
+        batches = (pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+                   for chunk in iter_fact_shards(partners, table, num_days, shard_size, seeds[1], workers))
+        ds.write_dataset(
+            batches, os.path.join(out_dir, table), schema=schema, format='parquet',
+            partitioning=['date'] if partition_by == 'date' else None,
+            partitioning_flavor='hive' if partition_by == 'date' else None,
+            basename_template='part-{i}.parquet',
+            max_rows_per_file=shard_size * 100,
+            max_rows_per_group=shard_size * 10,
+            existing_data_behavior='delete_matching',
+            preserve_order=True
+        )
+    return out_dir
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic partner dataset as partitioned Parquet files")
+    parser.add_argument('out_dir')
+    parser.add_argument('--partners', type=int, default=30)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--shard-size', type=int, default=10000)
+    parser.add_argument('--partition-by', choices=['partner', 'date'], default='partner')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes generating shards in parallel (0 for one per CPU core)")
+    args = parser.parse_args()
+    write_parquet_dataset(args.out_dir, args.partners, args.days, args.shard_size, args.partition_by, args.seed,
+                          args.workers or os.cpu_count())
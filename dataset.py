@@ -0,0 +1,297 @@
+import hashlib
+import os
+from functools import cached_property
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from cache import frame_fingerprint
+from rollup import build_daily_rollup, partner_totals, merge_rollups, merge_totals
+from hierarchy import Hierarchy, downline_totals
+from search import SearchIndex
+from config import LEVELS, STATUS_OPTIONS, ACTIVITY_TYPES, PRODUCTS
+
+TABLES = ['partners', 'sales', 'activity', 'social']
+FACT_TABLES = TABLES[1:]
+# Rows appended to a saved dataset land in <dir>/APPENDED_DIR/<table>/ (see feed.py)
+APPENDED_DIR = 'appended'
+
+# Column dtypes per table. Categories listed here are the known values; anything
+# else found in loaded data is appended so no value is ever lost.
+SCHEMA = {
+    'partners': {
+        'partner_id': 'int32',
+        'level': LEVELS,
+        'parent_id': 'Int32',
+        'join_date': 'datetime64[ns]',
+        'status': STATUS_OPTIONS,
+        'posts': 'int32',
+        'shares': 'int32',
+        'sentiment': 'float64',
+        'advocacy_score': 'int32',
+        'engagement': 'int32',
+        'total_revenue': 'float64',
+    },
+    'sales': {
+        'partner_id': 'int32',
+        'date': 'datetime64[ns]',
+        'revenue': 'float64',
+        'product': PRODUCTS,
+    },
+    'activity': {
+        'partner_id': 'int32',
+        'date': 'datetime64[ns]',
+        'activity_type': ACTIVITY_TYPES,
+        'duration_minutes': 'float32',
+    },
+    'social': {
+        'partner_id': 'int32',
+        'date': 'datetime64[ns]',
+        'posts': 'int32',
+        'shares': 'int32',
+        'sentiment': 'float64',
+        'advocacy_score': 'int32',
+        'reviews': 'int32',
+    },
+}
+
+def _as_categorical(series, categories):
+    """Cast to a categorical with the known categories first, keeping unknown values"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if list(series.cat.categories) == categories:
+            return series
+        known = series.cat.categories.astype(str)
+        if (known == series.cat.categories).all():
+            # Only the category list changes, the column itself is never rebuilt as strings
+            return series.cat.set_categories(categories + sorted(set(known) - set(categories)))
+    values = series.astype(str)
+    extra = sorted(set(values.unique()) - set(categories))
+    return values.astype(pd.CategoricalDtype(categories + extra))
+
+def typed(table, df):
+    """Return df with the column dtypes declared in SCHEMA for the given table.
+
+    Columns already in the right dtype are left untouched, so calling this on
+    freshly generated data costs next to nothing.
+    """
+    df = df.copy(deep=False)
+    for column, dtype in SCHEMA[table].items():
+        if column not in df.columns:
+            continue
+        if isinstance(dtype, list):
+            df[column] = _as_categorical(df[column], dtype)
+        elif dtype.startswith('datetime64'):
+            if df[column].dtype != dtype:
+                df[column] = pd.to_datetime(df[column]).astype(dtype)
+        elif df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+def read_saved_table(path, table):
+    """Read a table saved either as <table>.parquet or as a directory of Parquet parts.
+
+    Rows appended since, under APPENDED_DIR/<table>/, follow in file name order.
+    """
+    file_path = os.path.join(path, f'{table}.parquet')
+    df = pd.read_parquet(file_path if os.path.exists(file_path) else os.path.join(path, table))
+    appended = os.path.join(path, APPENDED_DIR, table)
+    if os.path.isdir(appended):
+        parts = [pd.read_parquet(os.path.join(appended, name)) for name in sorted(os.listdir(appended))
+                 if name.endswith('.parquet')]
+        df = pd.concat([df] + parts, ignore_index=True)
+    if 'date' in df.columns and table != 'partners':
+        # Hive date partitions come back as a trailing column
+        columns = ['partner_id', 'date'] + [c for c in df.columns if c not in ('partner_id', 'date')]
+        df = df[columns]
+    return df
+
+def _sorted_by_partner(df):
+    """Stable-sort a table by partner_id unless it is already grouped that way"""
+    if df['partner_id'].is_monotonic_increasing:
+        return df
+    return df.sort_values('partner_id', kind='stable', ignore_index=True)
+
+def _merge_by_partner(table, first, second):
+    """Rows of two partner-sorted frames of a table in one partner-sorted frame.
+
+    Within a partner the rows of first come before those of second, as a stable
+    sort of both stacked would leave them, but the rows are merged in one pass
+    instead of sorted again. Categorical columns stay categorical.
+    """
+    first, second = first.copy(deep=False), second.copy(deep=False)
+    for column, dtype in SCHEMA[table].items():
+        if isinstance(dtype, list) and column in first.columns and column in second.columns:
+            known = list(first[column].cat.categories)
+            categories = known + [value for value in second[column].cat.categories if value not in set(known)]
+            # Only the category lists change, so neither column is rebuilt
+            first[column] = first[column].cat.set_categories(categories)
+            second[column] = second[column].cat.set_categories(categories)
+    inserted = np.searchsorted(first['partner_id'].to_numpy(), second['partner_id'].to_numpy(), side='right')
+    inserted += np.arange(len(second))
+    order = np.empty(len(first) + len(second), dtype=np.int64)
+    kept = np.ones(len(order), dtype=bool)
+    kept[inserted] = False
+    order[kept] = np.arange(len(first))
+    order[inserted] = len(first) + np.arange(len(second))
+    return pd.concat([first, second], ignore_index=True).take(order).reset_index(drop=True)
+
+class PartnerIndex:
+    """Offsets into a partner-sorted table, so one partner's rows are a contiguous slice.
+
+    Dense ids are addressed directly, making a lookup O(1); sparse ids fall back
+    to a binary search over the distinct ids.
+    """
+
+    def __init__(self, df):
+        self.frame = _sorted_by_partner(df)
+        ids = self.frame['partner_id'].to_numpy()
+        self.keys = np.unique(ids)
+        self.dense = len(ids) == 0 or (self.keys[0] >= 0 and self.keys[-1] <= 2 * len(self.keys) + 1024)
+        if self.dense:
+            counts = np.bincount(ids, minlength=int(self.keys[-1]) + 2 if len(ids) else 1)
+            self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        else:
+            self.offsets = np.searchsorted(ids, np.append(self.keys, self.keys[-1] + 1))
+
+    def _bounds(self, partner_ids):
+        partner_ids = np.asarray(partner_ids, dtype=np.int64)
+        if self.dense:
+            valid = (partner_ids >= 0) & (partner_ids < len(self.offsets) - 1)
+            slot = np.where(valid, partner_ids, 0)
+        else:
+            slot = np.minimum(np.searchsorted(self.keys, partner_ids), len(self.keys) - 1)
+            valid = self.keys[slot] == partner_ids if len(self.keys) else np.zeros(len(partner_ids), bool)
+            slot = np.where(valid, slot, 0)
+        starts = np.where(valid, self.offsets[slot], 0)
+        stops = np.where(valid, self.offsets[slot + 1], 0)
+        return starts, stops
+
+    def rows(self, partner_id):
+        """Rows of a single partner as a zero-copy slice"""
+        starts, stops = self._bounds([partner_id])
+        return self.frame.iloc[starts[0]:stops[0]]
+
+    def rows_for(self, partner_ids):
+        """Rows of a set of partners, gathered from their slices in partner order"""
+        partner_ids = np.unique(np.asarray(partner_ids, dtype=np.int64))
+        starts, stops = self._bounds(partner_ids)
+        lengths = stops - starts
+        total = int(lengths.sum())
+        if total == len(self.frame):
+            return self.frame
+        # Expand each [start, stop) range into row positions without a Python loop
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        return self.frame.iloc[positions]
+
+class Dataset:
+    """Partners with their sales, activity and social tables, held in typed columns"""
+
+    def __init__(self, partners, sales, activity, social):
+        self.partners = _sorted_by_partner(typed('partners', partners))
+        self.sales = _sorted_by_partner(typed('sales', sales))
+        self.activity = _sorted_by_partner(typed('activity', activity))
+        self.social = _sorted_by_partner(typed('social', social))
+
+    def tables(self):
+        return {table: getattr(self, table) for table in TABLES}
+
+    @cached_property
+    def rollup(self):
+        """Partner x day rollup of every additive KPI (see rollup.build_daily_rollup)"""
+        return build_daily_rollup(self.sales, self.activity, self.social)
+
+    @cached_property
+    def partner_kpis(self):
+        """Rollup totals per partner over the whole history"""
+        return partner_totals(self.rollup)
+
+    @cached_property
+    def hierarchy(self):
+        """Euler-tour view of the partner tree"""
+        return Hierarchy(self.partners)
+
+    @cached_property
+    def downline(self):
+        """Downline partner count, revenue and activity per partner"""
+        return downline_totals(self.hierarchy, self.partner_kpis)
+
+    @cached_property
+    def search(self):
+        """Name and id search over the partners table"""
+        return SearchIndex(self.partners)
+
+    @cached_property
+    def index(self):
+        """PartnerIndex per table and for the rollup, built once per dataset"""
+        index = {table: PartnerIndex(df) for table, df in self.tables().items()}
+        index['rollup'] = PartnerIndex(self.rollup)
+        return index
+
+    @cached_property
+    def fingerprint(self):
+        """Content hash of all four tables, computed once per dataset"""
+        return frame_fingerprint(*self.tables().values())
+
+    def append(self, **tables):
+        """A new dataset with rows added to its fact tables, its rollup updated in place of rebuilt.
+
+        tables maps fact table names to their new rows, all for known partners.
+        The rollup and partner totals are extended with those of the new rows
+        only; partners, hierarchy and search carry over, as partners are
+        unchanged. Rows land where Dataset.load would put them after a save, so
+        the result matches reloading the appended tables.
+        """
+        delta = {table: _sorted_by_partner(typed(table, tables.get(table, getattr(self, table).iloc[:0])))
+                 for table in FACT_TABLES}
+        appended = Dataset(self.partners, *(_merge_by_partner(table, getattr(self, table), delta[table])
+                                            for table in FACT_TABLES))
+        delta_rollup = build_daily_rollup(*delta.values())
+        appended.rollup = merge_rollups(self.rollup, delta_rollup)
+        appended.partner_kpis = merge_totals(self.partner_kpis, partner_totals(delta_rollup))
+        appended.hierarchy = self.hierarchy
+        appended.search = self.search
+        # Derived from the old content hash and the new rows', instead of hashing every table again
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update((self.fingerprint + frame_fingerprint(*delta.values())).encode())
+        appended.fingerprint = digest.hexdigest()
+        return appended
+
+    def memory_usage(self):
+        """Deep memory footprint of each table in MB"""
+        return pd.Series({table: df.memory_usage(deep=True).sum() / 2**20
+                          for table, df in self.tables().items()}, name='memory_mb')
+
+    def save(self, path):
+        """Persist every table as <path>/<table>.parquet, keeping dtypes and categories"""
+        os.makedirs(path, exist_ok=True)
+        for table, df in self.tables().items():
+            df.to_parquet(os.path.join(path, f'{table}.parquet'), index=False)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Load a directory written by Dataset.save or by `python data.py <dir>`"""
+        return cls(*(read_saved_table(path, table) for table in TABLES))
+
+    def save_arrow(self, path):
+        """Write every table and the rollup as uncompressed Arrow IPC files, ready to memory-map"""
+        os.makedirs(path, exist_ok=True)
+        for name, df in dict(self.tables(), rollup=self.rollup).items():
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with ipc.new_file(os.path.join(path, f'{name}.arrow'), table.schema) as writer:
+                writer.write_table(table)
+        return path
+
+    @classmethod
+    def load_arrow(cls, path):
+        """Memory-map a directory written by save_arrow.
+
+        Columns are read-only views of the mapped files rather than copies, so
+        the operating system shares their pages between processes and can drop
+        them under memory pressure. The rollup is mapped too instead of rebuilt.
+        """
+        frames = {name: ipc.open_file(pa.memory_map(os.path.join(path, f'{name}.arrow'))).read_all()
+                  .to_pandas(split_blocks=True) for name in TABLES + ['rollup']}
+        dataset = cls(*(frames[table] for table in TABLES))
+        dataset.rollup = frames['rollup']
+        return dataset
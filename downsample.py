@@ -0,0 +1,81 @@
+import numpy as np
+
+DOWNSAMPLING = ['lttb', 'minmax']
+
+def _as_float(x):
+    """Numeric x values for area math: datetimes become days since the first point"""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+        return (x - x[0]) / 86_400e9 if len(x) else x.astype(float)
+    return x.astype(float)
+
+def lttb(x, y, budget):
+    """Positions of at most budget points chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept. The rest are split into budget - 2
+    buckets of consecutive points, and from each the point forming the largest
+    triangle with the previously kept point and the next bucket's average is
+    kept. Peaks and the overall shape survive far better than with striding.
+    x must be sorted.
+    """
+    n = len(y)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+    x = _as_float(x)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    # Average of every bucket; the last bucket looks ahead to the final point
+    next_x = np.append((np.add.reduceat(x[:n - 1], edges[:-1]) / sizes)[1:], x[-1])
+    next_y = np.append((np.add.reduceat(y[:n - 1], edges[:-1]) / sizes)[1:], y[-1])
+
+    kept = np.empty(budget, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for bucket in range(budget - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        area = np.abs((x[a] - next_x[bucket]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[bucket] - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[bucket + 1] = a
+    return kept
+
+def minmax(x, y, budget):
+    """Positions of the lowest and highest point of budget // 2 equal-count buckets, in order"""
+    n = len(y)
+    if budget >= n or budget < 2:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    starts = np.arange(budget // 2) * n // (budget // 2)
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    kept = []
+    for extreme in (np.minimum, np.maximum):
+        # First point of each bucket equal to the bucket's extreme
+        hit = np.flatnonzero(y == extreme.reduceat(y, starts)[bucket])
+        kept.append(hit[np.append(True, bucket[hit][1:] != bucket[hit][:-1])])
+    return np.union1d(*kept)
+
+def downsample(x, y, budget, method='lttb'):
+    """Positions of the points of a sorted series to draw within a budget of points"""
+    if method == 'lttb':
+        return lttb(x, y, budget)
+    if method == 'minmax':
+        return minmax(x, y, budget)
+    raise ValueError(f"Unknown downsampling method: {method}")
+
+def bucket_sums(x, values, budget):
+    """Sum values into at most budget equal-width x buckets, for bar charts.
+
+    x must be sorted datetimes or numbers and values is a 2-D array with one
+    column per stacked series. Returns the start of each non-empty bucket and
+    its sums; with budget or fewer points the input comes back unchanged.
+    """
+    x = np.asarray(x)
+    values = np.asarray(values, dtype=float)
+    if len(x) <= budget:
+        return x, values
+    numeric = _as_float(x)
+    span = numeric[-1] - numeric[0]
+    bucket = np.minimum((numeric - numeric[0]) / span * budget, budget - 1).astype(np.int64) if span else np.zeros(len(x), dtype=np.int64)
+    starts = np.flatnonzero(np.append(True, bucket[1:] != bucket[:-1]))
+    return x[starts], np.add.reduceat(values, starts, axis=0)
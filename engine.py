@@ -0,0 +1,134 @@
+import gzip
+import os
+import sys
+from collections import namedtuple
+import numpy as np
+from dataset import TABLES, Dataset, read_saved_table
+from ingest import read_table, validate
+from kpi import compute_kpis, filter_key
+from export import EXPORT_FORMATS, export_tables, file_name, write_table, write_bundle
+from profiler import Profiler
+
+# The sidebar filter state. None means every level or status; search only narrows
+# the partners when no single partner is selected, exactly as in the app
+FilterSpec = namedtuple('FilterSpec', ['levels', 'statuses', 'search', 'partner_id'],
+                        defaults=(None, None, '', None))
+
+def spec_key(spec, dataset):
+    """Hashable cache key of a spec, with unset levels and statuses spelled out"""
+    partners = dataset.partners
+    levels = partners['level'].unique().tolist() if spec.levels is None else spec.levels
+    statuses = partners['status'].unique().tolist() if spec.statuses is None else spec.statuses
+    return filter_key(levels, statuses, spec.search, spec.partner_id)
+
+def filter_mask(dataset, spec):
+    """Boolean mask over dataset.partners of the partners a spec keeps"""
+    partners = dataset.partners
+    mask = np.ones(len(partners), dtype=bool)
+    if spec.levels is not None:
+        mask &= partners['level'].isin(spec.levels).to_numpy()
+    if spec.statuses is not None:
+        mask &= partners['status'].isin(spec.statuses).to_numpy()
+    if spec.search and spec.partner_id is None:
+        matched = np.zeros(len(partners), dtype=bool)
+        matched[dataset.search.matches(spec.search)] = True
+        mask &= matched
+    return mask
+
+def compute(dataset, spec=FilterSpec()):
+    """Every summary frame of the dashboard for one filter spec (see kpi.compute_kpis)"""
+    filtered_df = dataset.partners[filter_mask(dataset, spec)]
+    return compute_kpis(filtered_df, dataset.rollup, dataset.partner_kpis, spec.partner_id,
+                        dataset.index['rollup'], dataset.downline)
+
+def _read_csv(path, table):
+    with open(path, 'rb') as source:
+        data = source.read()
+    if path.endswith('.gz'):
+        data = gzip.decompress(data)
+        path = path[:-3]
+    return read_table(table, data, path)
+
+def load_dataset(path):
+    """Load the four tables from a directory and check them.
+
+    Each table is read from <table>.csv or <table>.csv.gz when present, and
+    otherwise from <table>.parquet or a <table>/ directory of Parquet parts,
+    as written by Dataset.save or `python data.py`. Raises ValueError listing
+    every problem ingest.validate finds.
+    """
+    tables = {}
+    for table in TABLES:
+        csv = [os.path.join(path, f"{table}{ext}") for ext in ('.csv', '.csv.gz')]
+        found = [candidate for candidate in csv if os.path.exists(candidate)]
+        tables[table] = _read_csv(found[0], table) if found else read_saved_table(path, table)
+    problems = validate(tables)
+    if problems:
+        raise ValueError("\n".join(problems))
+    return Dataset(**tables)
+
+def write_exports(kpis, out_dir, fmt='csv.gz', bundle=False):
+    """Write the export tables to out_dir, one file each or a single zip; returns the paths"""
+    os.makedirs(out_dir, exist_ok=True)
+    tables = export_tables(kpis)
+    if bundle:
+        path = os.path.join(out_dir, f"partner_dashboard_{fmt.replace('.', '_')}.zip")
+        with open(path, 'wb') as out:
+            write_bundle(tables, out, fmt)
+        return [path]
+    paths = []
+    for name, df in tables.items():
+        paths.append(os.path.join(out_dir, file_name(name, fmt)))
+        with open(paths[-1], 'wb') as out:
+            write_table(df, out, fmt)
+    return paths
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compute the dashboard's KPI tables from files on disk")
+    parser.add_argument('source', help="directory holding partners, sales, activity and social tables")
+    parser.add_argument('out_dir', help="directory the export tables are written to")
+    parser.add_argument('--levels', nargs='+', help="keep only these partner levels")
+    parser.add_argument('--statuses', nargs='+', help="keep only these partner statuses")
+    parser.add_argument('--search', default='', help="keep only partners matching this name or id")
+    parser.add_argument('--partner', type=int, help="report on this partner alone")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv.gz')
+    parser.add_argument('--zip', action='store_true', help="write one zip archive instead of one file per table")
+    parser.add_argument('--timings', action='store_true', help="print how long each step took")
+    parser.add_argument('--backend', choices=['pandas', 'sqlite', 'duckdb'], default='pandas',
+                        help="run the KPI queries in memory with pandas or as SQL in an embedded database")
+    parser.add_argument('--database', help="database file of the SQL backends; built from source when missing, "
+                                           "and then queried without loading source at all")
+    args = parser.parse_args(argv)
+    # Imported here, as query.py builds on this module
+    from query import SQLBackend, open_backend
+
+    profiler = Profiler()
+    profiler.begin()
+    profiler.stage('load')
+    if args.backend != 'pandas' and args.database and os.path.exists(args.database):
+        backend = SQLBackend.open(args.database, args.backend)
+    else:
+        try:
+            dataset = load_dataset(args.source)
+        except (OSError, ValueError) as error:
+            print(f"Cannot load {args.source}:\n{error}", file=sys.stderr)
+            return 1
+        profiler.stage('prepare')
+        dataset.rollup, dataset.partner_kpis, dataset.downline, dataset.index
+        backend = open_backend(dataset, args.backend, args.database or ':memory:')
+    profiler.stage('compute')
+    kpis = backend.compute(FilterSpec(args.levels, args.statuses, args.search, args.partner))
+    profiler.stage('write')
+    paths = write_exports(kpis, args.out_dir, args.format, args.zip)
+    profiler.end()
+
+    for path in paths:
+        print(path)
+    if args.timings:
+        print(profiler.last()[['name', 'seconds']].to_string(index=False), file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import gzip
+import io
+import zipfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+from config import EXPORT_CHUNK_ROWS
+
+# Download formats: file extension, MIME type and whether the output is already compressed
+EXPORT_FORMATS = {
+    'csv.gz': ('csv.gz', 'application/gzip', True),
+    'parquet': ('parquet', 'application/vnd.apache.parquet', True),
+    'csv': ('csv', 'text/csv', False),
+}
+EXPORT_LABELS = {'csv.gz': "CSV (gzip)", 'parquet': "Parquet", 'csv': "CSV"}
+
+# Exported file names and the compute_kpis frames they hold
+EXPORT_TABLES = {
+    'revenue_summary': 'summary',
+    'activity_summary': 'activity_summary',
+    'social_summary': 'social_summary',
+    'partner_complete_kpi_summary': 'kpi_summary',
+    'revenue_time_series': 'revenue_time',
+    'activity_time_series': 'activity_time',
+    'social_time_series': 'social_time',
+}
+
+def write_csv(df, stream, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write df as CSV text to a binary stream, chunk_rows rows at a time"""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='', write_through=True)
+    for start in range(0, max(len(df), 1), chunk_rows):
+        df.iloc[start:start + chunk_rows].to_csv(text, index=False, header=start == 0)
+    text.detach()
+
+def write_parquet(df, stream, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write df as Parquet to a binary stream, one row group per chunk_rows rows"""
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(stream, schema, compression='zstd') as writer:
+        for start in range(0, max(len(df), 1), chunk_rows):
+            writer.write_table(pa.Table.from_pandas(df.iloc[start:start + chunk_rows],
+                                                    schema=schema, preserve_index=False))
+
+def write_table(df, stream, fmt):
+    if fmt == 'csv.gz':
+        # Chunks are compressed as they are written, so the whole CSV text never exists at once
+        with gzip.GzipFile(fileobj=stream, mode='wb', compresslevel=1, mtime=0) as compressed:
+            write_csv(df, compressed)
+    elif fmt == 'parquet':
+        write_parquet(df, stream)
+    elif fmt == 'csv':
+        write_csv(df, stream)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+def file_name(name, fmt):
+    return f"{name}.{EXPORT_FORMATS[fmt][0]}"
+
+def mime_type(fmt):
+    return EXPORT_FORMATS[fmt][1]
+
+def export_table(df, fmt):
+    """Serialized bytes of one table in the given format"""
+    buffer = io.BytesIO()
+    write_table(df, buffer, fmt)
+    return buffer.getvalue()
+
+def export_tables(kpis):
+    """{file name: frame} of every exported table, from the output of compute_kpis"""
+    return {name: kpis[key] for name, key in EXPORT_TABLES.items()}
+
+def write_bundle(tables, stream, fmt):
+    """Write a zip archive holding every table of a {name: DataFrame} mapping to a binary stream.
+
+    Each table is streamed straight into its archive member. Members that are
+    already compressed (csv.gz, Parquet) are stored rather than deflated again.
+    """
+    method = zipfile.ZIP_STORED if EXPORT_FORMATS[fmt][2] else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(stream, 'w', compression=method) as archive:
+        for name, df in tables.items():
+            with archive.open(file_name(name, fmt), 'w', force_zip64=True) as member:
+                write_table(df, member, fmt)
+
+def export_bundle(tables, fmt):
+    """Zip archive bytes holding every table of a {name: DataFrame} mapping"""
+    buffer = io.BytesIO()
+    write_bundle(tables, buffer, fmt)
+    return buffer.getvalue()
+
+def exporter(df, fmt):
+    """Zero-argument callable producing the export, for a lazy st.download_button"""
+    return lambda: export_table(df, fmt)
+
+def bundle_exporter(tables, fmt):
+    return lambda: export_bundle(tables, fmt)
@@ -0,0 +1,209 @@
+"""Incremental ingestion of new sales, activity and social rows into a saved dataset.
+
+Files dropped into a directory stand in for the CRM feed. Each is named after
+its table (sales-2024-06-01.csv, activity.parquet, ...) and read like an
+upload. A table's watermark is the latest day already ingested, together with
+a hash of every row ingested for that day. Rows dated after the watermark day
+are appended to the dataset directory as Parquet parts under
+appended/<table>/. Rows dated on that day are appended too, unless they match
+a row already ingested for it: the feed keeps delivering a day until it is
+over. Older rows are counted as stale and dropped. Watermarks are kept in
+<dataset>/watermarks.json and advanced after each file's rows are written, so
+a file read twice is not appended twice.
+"""
+import json
+import os
+import shutil
+import sys
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from dataset import FACT_TABLES, SCHEMA, APPENDED_DIR, read_saved_table, typed
+from ingest import read_table, table_name, validate
+
+WATERMARK_FILE = 'watermarks.json'
+# Where read files are moved within the drop directory
+PROCESSED_DIR = 'processed'
+REJECTED_DIR = 'rejected'
+
+# Columns beyond SCHEMA that tell two rows apart, hashed whenever a file carries them
+ID_COLUMNS = {'sales': ['transaction_id']}
+
+# Latest ingested day of a table and the hashes of the rows ingested for it
+Watermark = namedtuple('Watermark', ['date', 'hashes'])
+
+# What became of one dropped file: rows appended, rows before the watermark day, rows of
+# that day already ingested, and why it was rejected (empty when it was not)
+FileResult = namedtuple('FileResult', ['file', 'table', 'appended', 'stale', 'duplicates', 'problems'])
+
+def row_hashes(table, rows):
+    """64-bit hash of every row over the table's SCHEMA and ID_COLUMNS columns.
+
+    Two sales differing only in transaction_id hash apart, so a second sale
+    of a fixed-price product on the watermark day is not taken for the first.
+    Categorical and string columns hash alike, so rows hash the same whether
+    read from CSV, Parquet or the saved dataset.
+    """
+    columns = list(SCHEMA[table]) + [column for column in ID_COLUMNS.get(table, []) if column in rows.columns]
+    return pd.util.hash_pandas_object(rows[columns], index=False).to_numpy()
+
+def _ingested_day(path, table, date=None):
+    """Watermark of a saved table for date (by default its latest day) from the rows it holds"""
+    # Typed like a loaded Dataset: a Hive date partition comes back as an unordered categorical
+    rows = typed(table, read_saved_table(path, table))
+    date = rows['date'].max() if date is None else date
+    if pd.isna(date):
+        return Watermark(pd.NaT, np.empty(0, dtype=np.uint64))
+    return Watermark(pd.Timestamp(date), row_hashes(table, rows[rows['date'] == date]))
+
+def load_watermarks(path):
+    """Watermark per fact table of a saved dataset.
+
+    Tables missing from watermarks.json start from the latest day they hold.
+    """
+    watermarks = {}
+    file_path = os.path.join(path, WATERMARK_FILE)
+    if os.path.exists(file_path):
+        with open(file_path) as source:
+            for table, value in json.load(source).items():
+                if isinstance(value, str):
+                    # Written before row hashes were kept: take them from the saved rows
+                    watermarks[table] = _ingested_day(path, table, pd.Timestamp(value))
+                else:
+                    watermarks[table] = Watermark(pd.Timestamp(value['date']), np.array(
+                        [int(digest, 16) for digest in value['rows']], dtype=np.uint64))
+    for table in FACT_TABLES:
+        if table not in watermarks:
+            watermarks[table] = _ingested_day(path, table)
+    return watermarks
+
+def save_watermarks(path, watermarks):
+    """Write watermarks.json aside and rename it, so it is never left half-written"""
+    file_path = os.path.join(path, WATERMARK_FILE)
+    with open(file_path + '.tmp', 'w') as out:
+        json.dump({table: {'date': value.date.isoformat(),
+                           'rows': [f"{digest:016x}" for digest in value.hashes.tolist()]}
+                   for table, value in watermarks.items() if not pd.isna(value.date)}, out)
+    os.replace(file_path + '.tmp', file_path)
+
+def _already_ingested(hashes, ingested):
+    """Mask of the hashes matching an ingested row, each ingested row matched at most once.
+
+    Only as many copies of a row count as duplicates as were ingested before,
+    so a row repeated within a file is still appended once per extra copy.
+    """
+    if not len(hashes) or not len(ingested):
+        return np.zeros(len(hashes), dtype=bool)
+    values, counts = np.unique(ingested, return_counts=True)
+    slot = np.minimum(np.searchsorted(values, hashes), len(values) - 1)
+    known = values[slot] == hashes
+    # How many earlier rows of this batch share each row's hash
+    order = np.argsort(hashes, kind='stable')
+    ordered = hashes[order]
+    starts = np.concatenate([[True], ordered[1:] != ordered[:-1]])
+    run_start = np.maximum.accumulate(np.where(starts, np.arange(len(ordered)), 0))
+    occurrence = np.empty(len(hashes), dtype=np.int64)
+    occurrence[order] = np.arange(len(ordered)) - run_start
+    return known & (occurrence < counts[slot])
+
+def append_rows(path, table, rows, source_name):
+    """Persist rows as the next Parquet part of a table's appended rows; returns its path"""
+    directory = os.path.join(path, APPENDED_DIR, table)
+    os.makedirs(directory, exist_ok=True)
+    sequence = sum(name.endswith('.parquet') for name in os.listdir(directory))
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    part = os.path.join(directory, f"{sequence:06d}-{stem}.parquet")
+    rows.to_parquet(part, index=False)
+    return part
+
+def _move(drop_dir, name, into):
+    os.makedirs(os.path.join(drop_dir, into), exist_ok=True)
+    shutil.move(os.path.join(drop_dir, name), os.path.join(drop_dir, into, name))
+
+def ingest_drop(path, drop_dir, dataset=None):
+    """Append the new rows of every file in drop_dir to the dataset saved at path.
+
+    Files are read in name order. A file naming no fact table, failing to
+    parse, or holding rows for unknown partners is moved to rejected/ and
+    nothing of it is appended; every other file goes to processed/. dataset,
+    when given, is the Dataset loaded from path; it is extended with the
+    appended rows through Dataset.append, so its rollup and partner totals are
+    updated rather than rebuilt. Returns (dataset, results), dataset being None
+    when none was given.
+    """
+    watermarks = load_watermarks(path)
+    partners = dataset.partners if dataset is not None else read_saved_table(path, 'partners')
+    names = sorted(name for name in os.listdir(drop_dir)
+                   if os.path.isfile(os.path.join(drop_dir, name)) and not name.startswith('.'))
+    results, new_rows = [], {table: [] for table in FACT_TABLES}
+    for name in names:
+        table = table_name(name)
+        if table not in FACT_TABLES:
+            problems = [f"name must start with one of {', '.join(FACT_TABLES)}"]
+            results.append(FileResult(name, table, 0, 0, 0, problems))
+            _move(drop_dir, name, REJECTED_DIR)
+            continue
+        try:
+            with open(os.path.join(drop_dir, name), 'rb') as source:
+                rows = read_table(table, source.read(), name)
+            problems = validate({'partners': partners, table: rows}, checked=[table])
+        except (pa.ArrowInvalid, pa.ArrowTypeError, KeyError, ValueError) as error:
+            problems = [f"could not parse: {error}"]
+        if problems:
+            results.append(FileResult(name, table, 0, 0, 0, problems))
+            _move(drop_dir, name, REJECTED_DIR)
+            continue
+
+        watermark, dates = watermarks[table], rows['date'].to_numpy()
+        hashes = row_hashes(table, rows)
+        if pd.isna(watermark.date):
+            stale = duplicate = np.zeros(len(rows), dtype=bool)
+        else:
+            day = np.datetime64(watermark.date)
+            stale = dates < day
+            duplicate = np.zeros(len(rows), dtype=bool)
+            duplicate[dates == day] = _already_ingested(hashes[dates == day], watermark.hashes)
+        fresh = ~stale & ~duplicate
+        if fresh.any():
+            rows = rows[fresh].reset_index(drop=True)
+            append_rows(path, table, rows, name)
+            latest = rows['date'].max()
+            hashes = hashes[fresh][rows['date'].to_numpy() == np.datetime64(latest)]
+            if latest == watermark.date:
+                hashes = np.concatenate([watermark.hashes, hashes])
+            watermarks[table] = Watermark(latest, hashes)
+            save_watermarks(path, watermarks)
+            new_rows[table].append(rows)
+        results.append(FileResult(name, table, int(fresh.sum()), int(stale.sum()), int(duplicate.sum()), []))
+        _move(drop_dir, name, PROCESSED_DIR)
+
+    new_rows = {table: pd.concat(frames, ignore_index=True) for table, frames in new_rows.items() if frames}
+    if dataset is not None and new_rows:
+        dataset = dataset.append(**new_rows)
+    return dataset, results
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Append new rows from a file-drop directory to a saved dataset")
+    parser.add_argument('dataset', help="directory written by Dataset.save or `python data.py`")
+    parser.add_argument('drop_dir', help="directory new sales, activity and social files are dropped into")
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help="keep polling the drop directory")
+    args = parser.parse_args(argv)
+
+    while True:
+        _, results = ingest_drop(args.dataset, args.drop_dir)
+        for result in results:
+            if result.problems:
+                print(f"{result.file}: rejected\n  " + "\n  ".join(result.problems), file=sys.stderr)
+            else:
+                print(f"{result.file}: {result.appended:,} {result.table} rows appended, {result.stale:,} stale, "
+                      f"{result.duplicates:,} already ingested")
+        if not args.watch:
+            return 1 if any(result.problems for result in results) else 0
+        time.sleep(args.watch)
+
+if __name__ == '__main__':
+    sys.exit(main())
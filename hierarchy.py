@@ -0,0 +1,239 @@
+import heapq
+import numpy as np
+import pandas as pd
+
+class Hierarchy:
+    """Euler-tour intervals over the partner tree defined by parent_id.
+
+    Partners are numbered in depth-first order (tin) and each subtree occupies the
+    contiguous range [tin, tout). Any subtree aggregate is then a single range sum
+    over a prefix array, descendants are a slice, and ancestors are a walk up the
+    parent pointers. Construction is vectorized one tree level at a time.
+    Partners whose parent chain never reaches a root (cycles) get depth -1 and
+    are left out of every interval.
+    """
+
+    def __init__(self, partners):
+        self.ids = partners['partner_id'].to_numpy(dtype=np.int64)
+        self._lookup = pd.Index(self.ids)
+        parent_ids = partners['parent_id'].astype('Float64').fillna(-1).to_numpy(dtype=np.int64)
+        self.parent = self._lookup.get_indexer(parent_ids)
+        n = len(self.ids)
+
+        # Children of every partner as contiguous runs of a CSR array
+        has_parent = self.parent >= 0
+        child_nodes = np.flatnonzero(has_parent)
+        child_nodes = child_nodes[np.argsort(self.parent[child_nodes], kind='stable')]
+        self.child_nodes = child_nodes
+        self.child_offsets = np.concatenate([[0], np.cumsum(np.bincount(self.parent[child_nodes], minlength=n))])
+
+        # Breadth-first levels from the roots
+        self.depth = np.full(n, -1, dtype=np.int32)
+        levels = [np.flatnonzero(~has_parent)]
+        while len(levels[-1]):
+            self.depth[levels[-1]] = len(levels) - 1
+            levels.append(self._children_of(levels[-1]))
+        levels.pop()
+
+        # Subtree sizes, deepest level first
+        self.size = np.where(self.depth >= 0, 1, 0).astype(np.int64)
+        for level in reversed(levels[1:]):
+            np.add.at(self.size, self.parent[level], self.size[level])
+
+        # Offset of each child inside its parent's interval: sizes of the earlier siblings
+        before = np.cumsum(self.size[child_nodes]) - self.size[child_nodes]
+        group_start = before[self.child_offsets[self.parent[child_nodes]]] if len(child_nodes) else before
+        sibling_offset = np.zeros(n, dtype=np.int64)
+        sibling_offset[child_nodes] = before - group_start
+
+        self.tin = np.full(n, -1, dtype=np.int64)
+        if levels:
+            roots = levels[0]
+            self.tin[roots] = np.cumsum(self.size[roots]) - self.size[roots]
+            for level in levels[1:]:
+                self.tin[level] = self.tin[self.parent[level]] + 1 + sibling_offset[level]
+        self.tout = np.where(self.tin >= 0, self.tin + self.size, -1)
+
+        reachable = np.flatnonzero(self.tin >= 0)
+        self.order = reachable[np.argsort(self.tin[reachable])]
+
+    def _children_of(self, frontier):
+        """Positions of the children of every position in frontier, as one array"""
+        starts, stops = self.child_offsets[frontier], self.child_offsets[frontier + 1]
+        lengths = stops - starts
+        runs = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return self.child_nodes[runs]
+
+    def _position(self, partner_id):
+        position = self._lookup.get_indexer([partner_id])[0]
+        if position < 0:
+            raise KeyError(partner_id)
+        return position
+
+    def prefix_sums(self, values):
+        """Prefix sums of per-partner values (aligned with the partners rows) in tour order"""
+        values = np.asarray(values, dtype=float)
+        return np.concatenate([[0.0], np.cumsum(values[self.order])])
+
+    def range_sum(self, prefix, partner_id, include_self=True):
+        """Subtree total of one partner from prefix_sums output"""
+        position = self._position(partner_id)
+        if self.tin[position] < 0:
+            return 0.0
+        start = self.tin[position] + (0 if include_self else 1)
+        return prefix[self.tout[position]] - prefix[start]
+
+    def subtree_totals(self, values, include_self=True):
+        """Subtree total of every partner at once"""
+        prefix = self.prefix_sums(values)
+        reachable = self.tin >= 0
+        start = np.where(reachable, self.tin + (0 if include_self else 1), 0)
+        stop = np.where(reachable, self.tout, 0)
+        return prefix[stop] - prefix[start]
+
+    def descendants(self, partner_id):
+        """Ids of every partner below this one, in depth-first order"""
+        position = self._position(partner_id)
+        if self.tin[position] < 0:
+            return self.ids[:0]
+        return self.ids[self.order[self.tin[position] + 1:self.tout[position]]]
+
+    def children(self, partner_id):
+        """Ids of the direct children"""
+        position = self._position(partner_id)
+        return self.ids[self.child_nodes[self.child_offsets[position]:self.child_offsets[position + 1]]]
+
+    def ancestors(self, partner_id):
+        """Ids from the root down to the direct parent, in O(depth); empty inside a cycle"""
+        position = self._position(partner_id)
+        path = []
+        for _ in range(max(self.depth[position], 0)):
+            position = self.parent[position]
+            path.append(int(self.ids[position]))
+        return path[::-1]
+
+    def depth_of(self, partner_id):
+        return int(self.depth[self._position(partner_id)])
+
+    def neighborhood(self, partner_id, hops=1, siblings=False):
+        """Ids of the ego network of one partner, in partners row order.
+
+        Holds the partner, its ancestors up to the root, its downline up to hops
+        levels down and, with siblings, the other children of its parent. Reads
+        only the parent pointers and the CSR children, so the cost follows the
+        size of the neighborhood rather than of the network.
+        """
+        position = self._position(partner_id)
+        parts = [self.positions(self.ancestors(partner_id)), np.array([position])]
+        for _ in range(hops):
+            parts.append(self._children_of(parts[-1]))
+            if not len(parts[-1]):
+                break
+        if siblings and self.parent[position] >= 0:
+            parent = self.parent[position]
+            parts.append(self.child_nodes[self.child_offsets[parent]:self.child_offsets[parent + 1]])
+        return self.ids[np.unique(np.concatenate(parts))]
+
+    def positions(self, partner_ids):
+        """Row positions of the given ids, -1 where unknown"""
+        return self._lookup.get_indexer(partner_ids)
+
+    def level_of_detail(self, visible, weights, budget, expanded=()):
+        """Choose what to draw so a large network stays within roughly budget items.
+
+        Starting from the roots, the subtree holding the most visible partners is
+        opened first, as long as its children still fit. Every partner listed in
+        expanded is opened together with its ancestors, whatever the budget. When
+        a partner has more children than fit, the smallest are bundled together.
+
+        Returns one row per drawn item: kind 'partner' is a single visible partner,
+        'cluster' stands for the whole subtree under partner_id and 'rest' for the
+        bundled leftover children of partner_id. count and weight hold the number
+        of visible partners and their summed weights behind each item.
+        """
+        visible = np.asarray(visible, dtype=bool)
+        counts = self.subtree_totals(visible).astype(np.int64)
+        sums = self.subtree_totals(np.asarray(weights, dtype=float) * visible)
+        roots = np.flatnonzero((self.parent < 0) & (self.tin >= 0))
+
+        forced = set()
+        for position in self.positions(list(expanded)):
+            while position >= 0 and self.tin[position] >= 0 and position not in forced:
+                forced.add(position)
+                position = self.parent[position]
+
+        def kids(node):
+            members = roots if node < 0 else self.child_nodes[self.child_offsets[node]:self.child_offsets[node + 1]]
+            members = members[counts[members] > 0]
+            return members[np.argsort(-counts[members], kind='stable')]
+
+        opened = {}
+
+        def open_node(node, room):
+            """Open node if at least one child fits; return how many items that adds"""
+            members = kids(node)
+            own = int(visible[node]) if node >= 0 else 0
+            # Opening replaces the node's own item, freeing one slot
+            fit = room + 1 - own
+            if len(members) > fit:
+                must = [member for member in members if member in forced]
+                keep = list(dict.fromkeys(must + members[:max(fit - 1 - len(must), 0)].tolist()))
+                shown, rest = keep, np.setdiff1d(members, keep)
+            else:
+                shown, rest = members.tolist(), members[:0]
+            if not shown and node not in forced and node >= 0:
+                return None
+            opened[node] = (shown, rest)
+            return own + len(shown) + (1 if len(rest) else 0) - 1
+
+        drawn = 1 + open_node(-1, budget - 1)
+        for node in sorted(forced, key=lambda position: self.depth[position]):
+            drawn += open_node(node, max(budget - drawn, 0))
+
+        def expandable(node):
+            return node not in opened and counts[node] > visible[node]
+
+        candidates = [(-counts[node], node) for node in opened[-1][0] if expandable(node)]
+        for node in forced:
+            candidates += [(-counts[child], child) for child in opened[node][0] if expandable(child)]
+        heapq.heapify(candidates)
+        while candidates and drawn < budget:
+            _, node = heapq.heappop(candidates)
+            if not expandable(node):
+                continue
+            added = open_node(node, budget - drawn)
+            if added is None or drawn + added > budget:
+                opened.pop(node, None)
+                continue
+            drawn += added
+            for child in opened[node][0]:
+                if expandable(child):
+                    heapq.heappush(candidates, (-counts[child], child))
+
+        # Walk the opened nodes from the top and list what gets drawn
+        rows = []
+        stack = [-1]
+        while stack:
+            node = stack.pop()
+            shown, rest = opened[node]
+            if node >= 0 and visible[node]:
+                rows.append((self.ids[node], 'partner', 1, sums[node] - sums[shown].sum() - sums[rest].sum()))
+            for child in shown:
+                if child in opened:
+                    stack.append(child)
+                elif counts[child] > visible[child]:
+                    rows.append((self.ids[child], 'cluster', counts[child], sums[child]))
+                else:
+                    rows.append((self.ids[child], 'partner', 1, sums[child]))
+            if len(rest):
+                rows.append((self.ids[node] if node >= 0 else 0, 'rest', counts[rest].sum(), sums[rest].sum()))
+        return pd.DataFrame(rows, columns=['partner_id', 'kind', 'count', 'weight'])
+
+def downline_totals(hierarchy, partner_kpis):
+    """Partner count, revenue and activity summed over everyone below each partner"""
+    kpis = partner_kpis.reindex(hierarchy.ids, fill_value=0)
+    return pd.DataFrame({
+        'downline_size': hierarchy.subtree_totals(np.ones(len(hierarchy.ids)), include_self=False).astype(np.int64),
+        'downline_revenue': hierarchy.subtree_totals(kpis['revenue'], include_self=False),
+        'downline_activity': hierarchy.subtree_totals(kpis['activity_count'], include_self=False).astype(np.int64),
+    }, index=pd.Index(hierarchy.ids, name='partner_id'))
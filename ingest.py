@@ -0,0 +1,159 @@
+import hashlib
+import io
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from cache import LRUCache
+from dataset import TABLES, SCHEMA, Dataset, typed
+from hierarchy import Hierarchy
+from config import LEVELS, INGEST_CACHE_SIZE
+
+# Columns every upload of a table must have; the partners table also needs names
+REQUIRED_COLUMNS = {table: list(columns) for table, columns in SCHEMA.items()}
+REQUIRED_COLUMNS['partners'].insert(1, 'name')
+
+# Parsed tables and assembled datasets (or their problems) by content hash, shared by every
+# session thread; LRUCache locks each operation
+_parsed = LRUCache(INGEST_CACHE_SIZE)
+_datasets = LRUCache(INGEST_CACHE_SIZE)
+# Content hash per Streamlit upload id, so a rerun does not hash the same bytes again
+_upload_hashes = LRUCache(INGEST_CACHE_SIZE * 4)
+
+def _arrow_type(dtype):
+    """Arrow type the CSV reader should produce for a SCHEMA dtype"""
+    if isinstance(dtype, list):
+        return pa.dictionary(pa.int32(), pa.string())
+    if dtype.startswith('datetime64'):
+        return pa.timestamp('ns')
+    return pa.from_numpy_dtype(np.dtype(dtype.lower()))
+
+def table_name(filename):
+    """Table a file is meant for, from its name (partners.csv, sales_2024.parquet, ...)"""
+    stem = os.path.splitext(os.path.basename(filename).lower())[0]
+    for table in TABLES:
+        if stem.startswith(table):
+            return table
+    return None
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _upload_hash(upload):
+    file_id = getattr(upload, 'file_id', None)
+    if file_id is None:
+        return content_hash(upload.getvalue())
+    return _upload_hashes.get_or_compute(file_id, lambda: content_hash(upload.getvalue()))
+
+def read_table(table, data, filename):
+    """Parse one CSV or Parquet upload into the typed layout of the given table.
+
+    CSV goes through the multi-threaded pyarrow reader with the SCHEMA dtypes
+    declared up front, so nothing is inferred from the data and categorical
+    columns are dictionary-encoded while parsing.
+    """
+    if filename.lower().endswith('.parquet'):
+        df = pq.read_table(io.BytesIO(data)).to_pandas()
+    else:
+        column_types = {column: _arrow_type(dtype) for column, dtype in SCHEMA[table].items()}
+        column_types['name'] = pa.string()
+        df = pa_csv.read_csv(
+            io.BytesIO(data), convert_options=pa_csv.ConvertOptions(column_types=column_types)).to_pandas()
+    return typed(table, df)
+
+def validate(tables, checked=None):
+    """List every problem found in a set of tables, empty when they are usable.
+
+    tables maps table names to frames and must include partners. Only the tables
+    named in checked (all by default) are inspected; partners are the reference
+    for every partner_id. All checks are vectorized over whole columns.
+    """
+    checked = list(tables) if checked is None else checked
+    problems = []
+    for table in checked:
+        missing = [column for column in REQUIRED_COLUMNS[table] if column not in tables[table].columns]
+        if missing:
+            problems.append(f"{table}: missing columns {', '.join(missing)}")
+    if problems:
+        return problems
+
+    partners = tables['partners']
+    partner_ids = partners['partner_id']
+    if 'partners' in checked:
+        duplicated = partner_ids[partner_ids.duplicated()].unique()
+        if len(duplicated):
+            problems.append(f"partners: {len(duplicated):,} duplicated partner_id values, e.g. {duplicated[0]}")
+
+        # Every parent must be a known partner
+        parents = partners['parent_id']
+        orphans = parents.notna() & ~parents.isin(partner_ids)
+        if orphans.any():
+            problems.append(f"partners: {orphans.sum():,} rows whose parent_id is not a partner, "
+                            f"e.g. partner {partner_ids[orphans].iloc[0]} -> {parents[orphans].iloc[0]}")
+
+        # Partners that never reach a root sit on a cycle or hang below one
+        hierarchy = Hierarchy(partners)
+        cyclic = hierarchy.depth < 0
+        if cyclic.any():
+            problems.append(f"partners: {cyclic.sum():,} partners in or below a parent_id cycle, "
+                            f"e.g. partner {hierarchy.ids[cyclic][0]}")
+
+        # A parent is never of a lower level than its children
+        codes = pd.Categorical(partners['level'].astype(str), categories=LEVELS).codes
+        unknown = codes < 0
+        if unknown.any():
+            problems.append(f"partners: {unknown.sum():,} rows with an unknown level, "
+                            f"e.g. {partners['level'][unknown].iloc[0]}")
+        has_parent = (hierarchy.parent >= 0) & ~unknown
+        has_parent[has_parent] &= codes[hierarchy.parent[has_parent]] >= 0
+        inverted = np.flatnonzero(has_parent)[codes[hierarchy.parent[has_parent]] > codes[has_parent]]
+        if len(inverted):
+            problems.append(f"partners: {len(inverted):,} partners above their parent's level, "
+                            f"e.g. partner {hierarchy.ids[inverted[0]]}")
+
+    for table in checked:
+        if table == 'partners':
+            continue
+        df = tables[table]
+        unknown = ~df['partner_id'].isin(partner_ids)
+        if unknown.any():
+            problems.append(f"{table}: {unknown.sum():,} rows for unknown partners, "
+                            f"e.g. partner_id {df['partner_id'][unknown].iloc[0]}")
+        if df['date'].isna().any():
+            problems.append(f"{table}: {df['date'].isna().sum():,} rows without a date")
+    return problems
+
+def load_uploads(uploads, base):
+    """Build a Dataset from uploaded files, taking tables that were not uploaded from base.
+
+    uploads are Streamlit UploadedFile objects, or anything else with a name and
+    getvalue(). A single file whose name names no table is read as the partners
+    table. Returns (dataset, problems); dataset is None when the uploads cannot
+    be used, and problems lists why.
+    """
+    by_table = {}
+    for upload in uploads:
+        table = table_name(upload.name) or ('partners' if len(uploads) == 1 else None)
+        if table is None:
+            return None, [f"{upload.name}: name must start with one of {', '.join(TABLES)}"]
+        by_table[table] = upload
+
+    hashes = {table: _upload_hash(upload) for table, upload in by_table.items()}
+    key = (base.fingerprint,) + tuple(sorted(hashes.items()))
+    # One lookup: another session may evict the entry between a membership test and a get
+    cached = _datasets.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        tables = {table: _parsed.get_or_compute((table, hashes[table]),
+                                                lambda: read_table(table, upload.getvalue(), upload.name))
+                  for table, upload in by_table.items()}
+    except (pa.ArrowInvalid, pa.ArrowTypeError, KeyError, ValueError) as error:
+        return None, [f"Could not parse upload: {error}"]
+    problems = validate(dict(base.tables(), **tables), checked=list(tables))
+    result = (None if problems else Dataset(**dict(base.tables(), **tables)), problems)
+    _datasets.put(key, result)
+    return result
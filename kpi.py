@@ -0,0 +1,145 @@
+import pandas as pd
+from ranking import Ranking
+
+PARTNER_COLUMNS = ['partner_id', 'name', 'level', 'status']
+# KPIs compared side by side on the Performance tab
+COMPARE_METRICS = ['revenue', 'activity_count', 'posts', 'shares', 'advocacy_score']
+
+def filter_key(levels, statuses, search_query, selected_partner_id):
+    """Normalize the sidebar filter state into a hashable cache key"""
+    # The search box only narrows the partner set when no single partner is selected
+    search = '' if selected_partner_id is not None else (search_query or '').lower()
+    return (
+        tuple(sorted(str(level) for level in levels)),
+        tuple(sorted(str(status) for status in statuses)),
+        search,
+        None if selected_partner_id is None else int(selected_partner_id),
+    )
+
+def _mean(sums, counts):
+    """Rebuild an average from a sum and count pair"""
+    return sums / counts.where(counts > 0)
+
+def compute_kpis(filtered_df, rollup, partner_kpis, selected_partner_id=None, rollup_index=None, downline=None):
+    """Compute every summary frame the dashboard shows for the filtered partners.
+
+    Everything is answered from the partner x day rollup (rollup.build_daily_rollup)
+    and its per-partner totals (rollup.partner_totals), never from raw events.
+    rollup_index is an optional PartnerIndex over the rollup; with it the
+    selected partners' rows are sliced instead of scanned. downline
+    (hierarchy.downline_totals) adds whole-subtree totals to kpi_summary.
+    """
+    partner_ids = filtered_df['partner_id'].to_numpy()
+
+    # If a specific partner is selected, only its rows count
+    if selected_partner_id is not None:
+        partner_ids = partner_ids[partner_ids == selected_partner_id]
+
+    partner_info = filtered_df[PARTNER_COLUMNS]
+    selected = partner_kpis[partner_kpis.index.isin(partner_ids)]
+    selected = selected.reset_index().merge(partner_info, on='partner_id')
+
+    # Per-day totals of the selected partners
+    if rollup_index is not None:
+        rows = rollup_index.rows_for(partner_ids)
+    else:
+        rows = rollup[rollup['partner_id'].isin(partner_ids)]
+    daily = rows.groupby('date').sum(numeric_only=True)
+    return summarize_kpis(selected, partner_info, daily, downline)
+
+def summarize_kpis(selected, partner_info, daily, downline=None):
+    """Shape the dashboard's frames from per-partner and per-day totals of the selected partners.
+
+    selected holds the partner_totals row of every selected partner joined with
+    its PARTNER_COLUMNS, in partner_id order; daily holds the rollup columns
+    summed per date, indexed by date. Every query backend reduces its data to
+    these two frames, so what follows is shared by all of them.
+    """
+    # Partners only appear in a summary when they have rows in the matching table
+    has_sales = selected[selected['sales_count'] > 0]
+    has_activity = selected[selected['activity_count'] > 0]
+    has_social = selected[selected['sentiment_count'] > 0]
+
+    # Revenue summary
+    summary = has_sales[['partner_id', 'revenue'] + PARTNER_COLUMNS[1:]].reset_index(drop=True)
+
+    # Activity summary
+    activity_summary = has_activity[['partner_id', 'activity_count'] + PARTNER_COLUMNS[1:]].reset_index(drop=True)
+
+    # Social metrics summary
+    social_summary = has_social[['partner_id', 'posts', 'shares']].assign(
+        sentiment=_mean(has_social['sentiment_sum'], has_social['sentiment_count']),
+        advocacy_score=_mean(has_social['advocacy_sum'], has_social['advocacy_count']),
+        reviews=has_social['reviews']
+    ).merge(partner_info, on='partner_id').reset_index(drop=True)
+
+    # Combined KPI summary for ranking
+    kpi_summary = summary.merge(
+        activity_summary[['partner_id', 'activity_count']],
+        on='partner_id', how='left'
+    ).merge(
+        social_summary[['partner_id', 'posts', 'shares', 'sentiment', 'advocacy_score', 'reviews']],
+        on='partner_id', how='left'
+    ).fillna(0)
+    if downline is not None:
+        kpi_summary = kpi_summary.merge(downline, left_on='partner_id', right_index=True, how='left')
+
+    # Aggregate by level
+    level_revenue = has_sales.groupby('level', observed=True)['revenue'].sum()
+    level_activity = has_activity.groupby('level', observed=True)['activity_count'].sum()
+    level_sums = has_social.groupby('level', observed=True)[
+        ['posts', 'shares', 'advocacy_sum', 'advocacy_count', 'sentiment_sum', 'sentiment_count']].sum()
+    level_social = pd.DataFrame({
+        'posts': level_sums['posts'],
+        'shares': level_sums['shares'],
+        'advocacy_score': _mean(level_sums['advocacy_sum'], level_sums['advocacy_count']),
+        'sentiment': _mean(level_sums['sentiment_sum'], level_sums['sentiment_count'])
+    })
+
+    # Time series summaries
+    revenue_time = daily.loc[daily['sales_count'] > 0, ['revenue']].reset_index()
+    activity_time = daily.loc[daily['activity_count'] > 0, ['activity_count']].reset_index()
+    social_days = daily[daily['sentiment_count'] > 0]
+    social_time = social_days[['posts', 'shares']].assign(
+        sentiment=_mean(social_days['sentiment_sum'], social_days['sentiment_count']),
+        advocacy_score=_mean(social_days['advocacy_sum'], social_days['advocacy_count']),
+        reviews=social_days['reviews']
+    ).reset_index()
+
+    # Headline metrics shown on the dashboard tabs
+    totals = {
+        'revenue': selected['revenue'].sum(),
+        'activities': int(selected['activity_count'].sum()),
+        'posts': int(selected['posts'].sum()),
+        'shares': int(selected['shares'].sum()),
+        'reviews': int(selected['reviews'].sum()),
+        'sentiment': selected['sentiment_sum'].sum() / selected['sentiment_count'].sum()
+                     if selected['sentiment_count'].sum() else float('nan'),
+        'advocacy_score': selected['advocacy_sum'].sum() / selected['advocacy_count'].sum()
+                          if selected['advocacy_count'].sum() else float('nan'),
+    }
+
+    return {
+        'summary': summary,
+        'activity_summary': activity_summary,
+        'social_summary': social_summary,
+        'kpi_summary': kpi_summary,
+        'ranking': Ranking(kpi_summary),
+        'level_revenue': level_revenue,
+        'level_activity': level_activity,
+        'level_social': level_social,
+        'revenue_time': revenue_time,
+        'activity_time': activity_time,
+        'social_time': social_time,
+        'totals': totals,
+    }
+
+def normalize_kpis(kpi_summary, rows=None, metrics=COMPARE_METRICS):
+    """Metrics as a percentage of their maximum over kpi_summary, for comparing partners.
+
+    rows, a subset of kpi_summary, limits the output to those partners. A
+    maximum of zero or less is taken as 1.
+    """
+    maxima = kpi_summary[metrics].max()
+    maxima = maxima.where(maxima > 0, 1)
+    return (kpi_summary if rows is None else rows)[metrics] / maxima * 100
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from hierarchy import Hierarchy
+from config import LEVELS
+
+LAYOUTS = ['tiered', 'force']
+
+# Pixel spacing between neighbouring nodes and between level tiers
+NODE_SPACING = 60
+TIER_SPACING = 250
+
+def _tiers(nodes, hierarchy):
+    """Row of each node: its level, or one below its parent for nodes without a level"""
+    tier = pd.Categorical(nodes['level'].astype(str), categories=LEVELS).codes.astype(np.int64) \
+        if 'level' in nodes else np.full(len(nodes), -1, dtype=np.int64)
+    missing = tier < 0
+    parent = hierarchy.parent
+    tier[missing] = np.where(parent[missing] >= 0, tier[np.maximum(parent[missing], 0)] + 1, len(LEVELS))
+    tier[tier < 0] = len(LEVELS)
+    return tier
+
+def tiered_layout(nodes, hierarchy):
+    """Place nodes in one band per level, ordered along the depth-first tour.
+
+    Wide bands wrap onto several rows of at most twice the square root of the
+    node count, so subtrees stay together and the picture keeps a usable
+    aspect ratio. Returns x and y in pixels, aligned with the rows of nodes.
+    """
+    tier = _tiers(nodes, hierarchy)
+    tour = np.where(hierarchy.tin >= 0, hierarchy.tin, len(tier))
+    order = np.lexsort((tour, tier))
+    counts = np.bincount(tier)
+    rank = np.empty(len(tier), dtype=np.int64)
+    rank[order] = np.arange(len(tier)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    per_row = max(int(np.ceil(2 * np.sqrt(len(tier)))), 10)
+    row, column = rank // per_row, rank % per_row
+    # Nodes on a band's last, partly filled row are spread over the full width too
+    in_row = np.minimum(counts[tier] - row * per_row, per_row)
+    width = min(per_row, counts.max() if len(counts) else 1) * NODE_SPACING
+    x = (column + 0.5) / in_row * width - width / 2
+
+    rows = -(-counts // per_row)
+    band_top = np.concatenate([[0], np.cumsum((rows - 1) * NODE_SPACING + TIER_SPACING)])[:len(counts)]
+    y = band_top[tier] + row * NODE_SPACING
+    return x.astype(float), y.astype(float)
+
+def force_layout(nodes, hierarchy, iterations=60, samples=64, seed=0):
+    """Spring layout over the node tree, vectorized over all nodes per step.
+
+    Links pull parent and child towards NODE_SPACING * 2 apart. Repulsion is
+    taken against a fresh random sample of nodes each step instead of every
+    pair, which keeps a step O(n * samples). Starts from the tiered layout so
+    the result stays recognisably top-down.
+    """
+    rng = np.random.default_rng(seed)
+    x, y = tiered_layout(nodes, hierarchy)
+    position = np.column_stack([x, y]) + rng.normal(scale=NODE_SPACING / 4, size=(len(x), 2))
+    n = len(position)
+    if n < 2:
+        return position[:, 0], position[:, 1]
+    child = np.flatnonzero(hierarchy.parent >= 0)
+    parent = hierarchy.parent[child]
+    spring = NODE_SPACING * 2
+    samples = min(samples, n - 1)
+    step = spring
+
+    for _ in range(iterations):
+        force = np.zeros_like(position)
+
+        # Repulsion from a random sample, scaled up to stand for every node
+        others = rng.integers(0, n, size=(n, samples))
+        delta = position[:, None, :] - position[others]
+        distance = np.maximum(np.hypot(delta[..., 0], delta[..., 1]), 1.0)
+        force += (delta * (spring ** 2 / distance ** 2)[..., None]).sum(axis=1) * (n - 1) / samples
+
+        # Attraction along parent links
+        delta = position[child] - position[parent]
+        distance = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 1.0)
+        pull = delta * ((distance - spring) / distance)[:, None]
+        np.add.at(force, child, -pull)
+        np.add.at(force, parent, pull)
+
+        # Move each node at most step pixels, cooling down linearly
+        length = np.maximum(np.hypot(force[:, 0], force[:, 1]), 1e-9)
+        position += force * (np.minimum(length, step) / length)[:, None]
+        step = max(step - spring / iterations, 1.0)
+    return position[:, 0], position[:, 1]
+
+def compute_layout(nodes, kind='tiered'):
+    """Positions for the rows of a network view as a frame of x and y indexed by partner_id.
+
+    nodes needs partner_id and parent_id, plus level for the tiers; links to
+    partners outside nodes are ignored.
+    """
+    hierarchy = Hierarchy(nodes)
+    if kind == 'tiered':
+        x, y = tiered_layout(nodes, hierarchy)
+    elif kind == 'force':
+        x, y = force_layout(nodes, hierarchy)
+    else:
+        raise ValueError(f"Unknown layout: {kind}")
+    return pd.DataFrame({'x': x.round(1), 'y': y.round(1)}, index=pd.Index(hierarchy.ids, name='partner_id'))
@@ -186,4 +186,69 @@ function highlightFilter(filter) {
     }
   }
   selectNodes(selectedNodes)
-}
\ No newline at end of file
+}
+// Partner tooltips are rendered here from compact node fields instead of being
+// shipped as HTML with every node. "d" holds [level, status, join date, revenue,
+// advocacy, sentiment, posts, shares, engagement]; "c" holds [partners, revenue]
+// for cluster nodes.
+const TOOLTIP_STYLE =
+  "font-family:Arial; max-width:300px; padding:10px; background:#f9f9f9; border:1px solid #ddd;";
+
+function escapeHtml(text) {
+  return String(text).replace(/[&<>"']/g, function (c) {
+    return { "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;" }[c];
+  });
+}
+
+function formatMoney(value) {
+  return "$" + Number(value).toLocaleString("en-US", { minimumFractionDigits: 2, maximumFractionDigits: 2 });
+}
+
+function tooltipRows(rows) {
+  return rows
+    .map(function (row) {
+      return "<tr><td><b>" + row[0] + ":</b></td><td>" + escapeHtml(row[1]) + "</td></tr>";
+    })
+    .join("");
+}
+
+function partnerTooltip(node) {
+  let rows;
+  let footer = "";
+  if (node.c) {
+    rows = [
+      ["Partners", node.c[0].toLocaleString("en-US")],
+      ["Revenue", formatMoney(node.c[1])],
+    ];
+    if (node.id > 0) {
+      footer = "<i>Pick it under Expand Cluster to open it</i>";
+    }
+  } else {
+    const d = node.d;
+    rows = [
+      ["Level", d[0]],
+      ["Status", d[1]],
+      ["Join Date", d[2]],
+      ["Revenue", formatMoney(d[3])],
+      ["Advocacy Score", d[4] + "/100"],
+      ["Sentiment", d[5]],
+      ["Posts", d[6]],
+      ["Shares", d[7]],
+      ["Engagement", d[8] + "/100"],
+    ];
+  }
+  const element = document.createElement("div");
+  element.style.cssText = TOOLTIP_STYLE;
+  element.innerHTML =
+    "<h3 style='margin:0 0 10px 0'>" + escapeHtml(node.label) + "</h3>" +
+    "<table style='width:100%; border-collapse:collapse;'>" + tooltipRows(rows) + "</table>" + footer;
+  return element;
+}
+
+function applyTooltips(nodes) {
+  nodes.update(
+    nodes.get({ fields: ["id", "label", "d", "c"] }).map(function (node) {
+      return { id: node.id, title: partnerTooltip(node) };
+    })
+  );
+}
@@ -0,0 +1,145 @@
+import json
+import logging
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from config import PROFILE_HISTORY
+
+logger = logging.getLogger(__name__)
+# Sessions run on their own threads but share the trace file
+_trace_lock = threading.Lock()
+
+class Profiler:
+    """Named timing spans for the reruns of one session.
+
+    A rerun is bracketed by begin() and end(). stage(name) closes the previous
+    top-level stage and opens the next, so straight-line script code needs one
+    call per stage; span(name) is a context manager for nested spans. With
+    memory on, every span also records the change in traced memory and its
+    peak (tracemalloc is process-wide, so concurrent sessions blur these).
+    The last PROFILE_HISTORY reruns are kept for per-stage percentiles, and
+    each finished rerun can be appended to a JSONL trace file and logged.
+    """
+
+    def __init__(self, history=PROFILE_HISTORY):
+        self.session = uuid.uuid4().hex[:8]
+        self.reruns = deque(maxlen=history)
+        self.count = 0
+        self.spans = []
+        self.memory = False
+        self.trace_file = None
+        self.log = False
+        self._open = []
+        self._stage = None
+        self._started = None
+        self._owns_tracing = False
+
+    def begin(self, memory=False, trace_file=None, log=False):
+        """Start timing a rerun, dropping whatever an interrupted rerun left open"""
+        self.memory, self.trace_file, self.log = memory, trace_file or None, log
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+        elif not memory and self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+        self.spans, self._open, self._stage = [], [], None
+        self._started = time.perf_counter()
+
+    def _push(self, name):
+        record = {'name': name, 'parent': self._open[-1]['name'] if self._open else None,
+                  'start_s': time.perf_counter() - self._started}
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # Fold the peak so far into the enclosing span before resetting it for this one
+            if self._open:
+                self._open[-1]['_peak'] = max(self._open[-1]['_peak'], peak)
+            tracemalloc.reset_peak()
+            record['_memory'], record['_peak'] = current, current
+        self._open.append(record)
+        return record
+
+    def _pop(self, record):
+        record['seconds'] = time.perf_counter() - self._started - record['start_s']
+        if '_memory' in record and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, record.pop('_peak'))
+            start = record.pop('_memory')
+            record['memory_delta'] = current - start
+            record['memory_peak'] = peak - start
+            if len(self._open) > 1:
+                self._open[-2]['_peak'] = max(self._open[-2]['_peak'], peak)
+            tracemalloc.reset_peak()
+        self._open.remove(record)
+        self.spans.append(record)
+
+    @contextmanager
+    def span(self, name):
+        if self._started is None:
+            yield
+            return
+        record = self._push(name)
+        try:
+            yield
+        finally:
+            self._pop(record)
+
+    def stage(self, name):
+        """End the current stage and start the named one"""
+        if self._started is None:
+            return
+        if self._stage is not None:
+            self._pop(self._stage)
+        self._stage = self._push(name)
+
+    def end(self):
+        """Finish the rerun: keep its stage times, and write the trace line or log line if enabled"""
+        if self._started is None:
+            return None
+        if self._stage is not None:
+            self._pop(self._stage)
+        total = time.perf_counter() - self._started
+        self._started, self._stage = None, None
+        self.count += 1
+        times = {'rerun': total}
+        for record in sorted(self.spans, key=lambda record: record['start_s']):
+            times[record['name']] = times.get(record['name'], 0.0) + record['seconds']
+        self.reruns.append(times)
+
+        if self.trace_file or self.log:
+            line = json.dumps({
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                'session': self.session,
+                'rerun': self.count,
+                'total_s': round(total, 6),
+                'spans': sorted(({key: round(value, 6) if isinstance(value, float) else value
+                                  for key, value in record.items()} for record in self.spans),
+                                key=lambda record: record['start_s']),
+            })
+            if self.trace_file:
+                with _trace_lock, open(self.trace_file, 'a') as trace:
+                    trace.write(line + '\n')
+            if self.log:
+                logger.info(line)
+        return total
+
+    def last(self):
+        """Spans of the last finished rerun in start order, as a frame"""
+        return pd.DataFrame(sorted(self.spans, key=lambda record: record['start_s']))
+
+    def summary(self):
+        """Per-stage milliseconds over the kept reruns: last, p50, p95 and max"""
+        names = list(dict.fromkeys(name for times in self.reruns for name in times))
+        rows = []
+        for name in names:
+            values = np.array([times[name] for times in self.reruns if name in times]) * 1000
+            rows.append({'stage': name, 'runs': len(values), 'last_ms': values[-1],
+                         'p50_ms': np.percentile(values, 50), 'p95_ms': np.percentile(values, 95),
+                         'max_ms': values.max()})
+        return pd.DataFrame(rows, columns=['stage', 'runs', 'last_ms', 'p50_ms', 'p95_ms', 'max_ms'])
@@ -0,0 +1,209 @@
+import sqlite3
+import threading
+from functools import cached_property
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from engine import FilterSpec, compute
+from kpi import PARTNER_COLUMNS, summarize_kpis
+from rollup import SUM_COLUMNS, COUNT_COLUMNS
+from search import SearchIndex
+
+# Where the dashboard's KPI queries run: in memory with pandas, or as SQL in an embedded database
+BACKENDS = ['pandas', 'sqlite', 'duckdb']
+EXTENSIONS = {'sqlite': '.sqlite', 'duckdb': '.duckdb'}
+TOTAL_COLUMNS = SUM_COLUMNS + COUNT_COLUMNS
+DOWNLINE_COLUMNS = {'downline_size': 'int64', 'downline_revenue': 'float64', 'downline_activity': 'int64'}
+
+class PandasBackend:
+    """KPI queries answered from the dataset's in-memory frames (see engine.compute)"""
+
+    name = 'pandas'
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def compute(self, spec=FilterSpec()):
+        return compute(self.dataset, spec)
+
+def _connect(path, engine, read_only=False):
+    if engine == 'sqlite':
+        if read_only:
+            path = Path(path).resolve().as_uri() + '?mode=ro'
+        # Sessions share one connection; SQLBackend serializes the queries
+        return sqlite3.connect(path, check_same_thread=False, uri=read_only)
+    try:
+        import duckdb
+    except ImportError as error:
+        raise ImportError("The duckdb backend needs the duckdb package (pip install duckdb)") from error
+    return duckdb.connect(path, read_only=read_only)
+
+def _in(column, values):
+    """SQL membership test and its parameters; an empty list matches nothing"""
+    if not len(values):
+        return 'FALSE', []
+    return f"{column} IN ({', '.join('?' * len(values))})", [str(value) for value in values]
+
+class SQLBackend:
+    """KPI queries run as SQL against an embedded SQLite or DuckDB database file.
+
+    The database holds the partners' filter columns, the partner x day rollup,
+    the per-partner totals and the downline totals. Level, status, search and
+    partner filters become one WHERE clause, and the per-partner and per-day
+    sums come back already aggregated, so only the selected partners' rows
+    ever reach pandas. Results match compute_kpis up to floating-point
+    summation order.
+    """
+
+    def __init__(self, con, engine):
+        self.con = con
+        self.name = engine
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, dataset, path=':memory:', engine='sqlite'):
+        """Write the tables a dataset's KPI queries need to a new database at path"""
+        backend = cls(_connect(path, engine), engine)
+        partners = dataset.partners[PARTNER_COLUMNS]
+        backend._load('partners', pd.DataFrame({
+            'partner_id': partners['partner_id'],
+            'name': partners['name'].astype(str),
+            # Lower-cased like SearchIndex does, so substring matches agree with it
+            'name_key': partners['name'].astype(str).str.lower(),
+            'level': partners['level'].astype(str),
+            'status': partners['status'].astype(str),
+        }), ['partner_id'])
+        rollup = dataset.rollup
+        days = rollup['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        backend._load('rollup', pd.concat([rollup[['partner_id']].assign(day=days), rollup[TOTAL_COLUMNS]], axis=1),
+                      ['partner_id', 'day'])
+        backend._load('downline', dataset.downline.reset_index(), ['partner_id'])
+        backend._load('categories', pd.DataFrame(
+            [(column, value, position) for column in ('level', 'status')
+             for position, value in enumerate(dataset.partners[column].cat.categories.astype(str))],
+            columns=['column_name', 'value', 'position']), ['column_name', 'position'])
+        # The per-partner totals are aggregated by the database itself
+        sums = ', '.join(f"CAST(SUM({column}) AS {'DOUBLE' if column in SUM_COLUMNS else 'BIGINT'}) AS {column}"
+                         for column in TOTAL_COLUMNS)
+        backend.con.execute(f"CREATE TABLE partner_totals AS SELECT partner_id, {sums} "
+                            f"FROM rollup GROUP BY partner_id ORDER BY partner_id")
+        if engine == 'sqlite':
+            backend.con.execute("CREATE UNIQUE INDEX partner_totals_id ON partner_totals (partner_id)")
+            backend.con.execute("CREATE INDEX partners_filters ON partners (level, status)")
+            backend.con.commit()
+        return backend
+
+    @classmethod
+    def open(cls, path, engine=None):
+        """Open a database written by build read-only, so several processes can share it.
+
+        Without an engine it follows the file extension.
+        """
+        if engine is None:
+            engine = 'duckdb' if path.endswith(EXTENSIONS['duckdb']) else 'sqlite'
+        return cls(_connect(path, engine, read_only=True), engine)
+
+    def _load(self, table, df, key):
+        if self.name == 'duckdb':
+            # DuckDB scans sorted columns with zone maps, so no index is declared
+            self.con.register('frame', df)
+            self.con.execute(f"CREATE TABLE {table} AS SELECT * FROM frame")
+            self.con.unregister('frame')
+            return
+        # Keyed WITHOUT ROWID tables keep each partner's rows together on disk
+        types = {column: 'INTEGER' if pd.api.types.is_integer_dtype(dtype) else
+                 'REAL' if pd.api.types.is_float_dtype(dtype) else 'TEXT' for column, dtype in df.dtypes.items()}
+        columns = ', '.join(f"{column} {sql_type}" for column, sql_type in types.items())
+        self.con.execute(f"CREATE TABLE {table} ({columns}, PRIMARY KEY ({', '.join(key)})) WITHOUT ROWID")
+        df.to_sql(table, self.con, if_exists='append', index=False, chunksize=100_000)
+
+    def _frame(self, sql, params=()):
+        if self.name == 'duckdb':
+            return self.con.execute(sql, list(params)).df()
+        return pd.read_sql_query(sql, self.con, params=list(params))
+
+    @cached_property
+    def categories(self):
+        """Categorical dtypes of level and status, with the categories of the source dataset"""
+        rows = self._frame("SELECT column_name, value FROM categories ORDER BY column_name, position")
+        return {column: pd.CategoricalDtype(rows.loc[rows['column_name'] == column, 'value'].tolist())
+                for column in ('level', 'status')}
+
+    @cached_property
+    def search(self):
+        """SearchIndex over the stored names, for the typo-tolerant fallback SQL cannot express"""
+        partners = self._frame("SELECT partner_id, name FROM partners ORDER BY partner_id")
+        return partners['partner_id'].to_numpy(), SearchIndex(partners)
+
+    def _matched(self, partner_ids):
+        """Make the matched table hold exactly partner_ids"""
+        frame = pd.DataFrame({'partner_id': np.asarray(partner_ids, dtype=np.int64)})
+        if self.name == 'duckdb':
+            self.con.register('matched', frame)
+            return
+        self.con.execute("CREATE TEMP TABLE IF NOT EXISTS matched (partner_id INTEGER PRIMARY KEY)")
+        self.con.execute("DELETE FROM matched")
+        self.con.executemany("INSERT INTO matched VALUES (?)", ((int(pid),) for pid in frame['partner_id']))
+
+    def _search_clause(self, search):
+        """WHERE clause keeping the partners that SearchIndex.matches would return"""
+        query = search.strip().lower()
+        if not query:
+            return 'TRUE', []
+        clause, params = "instr(p.name_key, ?) > 0", [query]
+        if query.encode('utf-8').isdigit():
+            clause, params = f"({clause} OR CAST(p.partner_id AS TEXT) LIKE ?)", params + [query + '%']
+        if self._frame(f"SELECT 1 AS hit FROM partners p WHERE {clause} LIMIT 1", params).empty:
+            # Nothing contains the query: fall back to the index's typo-tolerant matches
+            ids, index = self.search
+            self._matched(ids[index.matches(search)])
+            return "p.partner_id IN (SELECT partner_id FROM matched)", []
+        return clause, params
+
+    def _where(self, spec):
+        clauses, params = [], []
+        for column, values in (('p.level', spec.levels), ('p.status', spec.statuses)):
+            if values is not None:
+                clause, values = _in(column, values)
+                clauses.append(clause)
+                params += values
+        if spec.search and spec.partner_id is None:
+            clause, values = self._search_clause(spec.search)
+            clauses.append(clause)
+            params += values
+        if spec.partner_id is not None:
+            clauses.append("p.partner_id = ?")
+            params.append(int(spec.partner_id))
+        return ' AND '.join(clauses) or 'TRUE', params
+
+    def compute(self, spec=FilterSpec()):
+        """Every summary frame of the dashboard for one filter spec, as compute_kpis returns them"""
+        with self.lock:
+            where, params = self._where(spec)
+            selected = self._frame(
+                f"SELECT t.*, p.name, p.level, p.status FROM partners p "
+                f"JOIN partner_totals t ON t.partner_id = p.partner_id WHERE {where} ORDER BY p.partner_id", params)
+            sums = ', '.join(f"CAST(SUM(r.{column}) AS {'DOUBLE' if column in SUM_COLUMNS else 'BIGINT'}) AS {column}"
+                             for column in TOTAL_COLUMNS)
+            daily = self._frame(
+                f"SELECT r.day, {sums} FROM partners p JOIN rollup r ON r.partner_id = p.partner_id "
+                f"WHERE {where} GROUP BY r.day ORDER BY r.day", params)
+            downline = self._frame(
+                f"SELECT d.* FROM partners p JOIN downline d ON d.partner_id = p.partner_id WHERE {where}", params)
+
+        # Restore the dtypes the in-memory frames carry
+        dtypes = {column: 'float64' if column in SUM_COLUMNS else 'int32' for column in TOTAL_COLUMNS}
+        selected = selected.astype(dict(dtypes, partner_id='int32', name=str, **self.categories))
+        daily = daily.astype(dtypes)
+        daily.index = pd.Index(daily.pop('day').to_numpy(dtype=np.int64).astype('datetime64[D]')
+                               .astype('datetime64[ns]'), name='date')
+        downline = downline.astype(dict(DOWNLINE_COLUMNS, partner_id='int32')).set_index('partner_id')
+        return summarize_kpis(selected, selected[PARTNER_COLUMNS], daily, downline)
+
+def open_backend(dataset, name='pandas', path=':memory:'):
+    """The query backend called name over dataset; SQL backends write their database to path"""
+    if name == 'pandas':
+        return PandasBackend(dataset)
+    if name not in EXTENSIONS:
+        raise ValueError(f"Unknown query backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return SQLBackend.build(dataset, path, name)
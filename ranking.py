@@ -0,0 +1,59 @@
+import numpy as np
+
+# KPI columns of kpi_summary that the Performance tab ranks partners by
+RANK_COLUMNS = ['revenue', 'activity_count', 'posts', 'shares', 'sentiment', 'advocacy_score',
+                'downline_revenue', 'downline_size']
+
+class Ranking:
+    """Top-k, bottom-k and percentile ranks over the KPI columns of a kpi_summary frame.
+
+    top and bottom pick their k rows with np.argpartition and only sort those,
+    so they cost O(n + k log k) instead of a full sort. Percentile ranks need
+    the full order and are computed once per column, on first use. Ties keep
+    the frame's row order and missing values always rank last.
+    """
+
+    def __init__(self, kpi_summary, columns=RANK_COLUMNS):
+        self.frame = kpi_summary
+        self.values = {column: kpi_summary[column].to_numpy(dtype=float)
+                       for column in columns if column in kpi_summary.columns}
+        self._percentiles = {}
+
+    def _select(self, keys, k):
+        """Positions of the k smallest keys, in order, ties broken by position"""
+        k = min(k, len(keys))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(keys):
+            # Of the rows tied with the k-th key, the earliest ones fill the remaining slots
+            kth = keys[np.argpartition(keys, k - 1)[k - 1]]
+            below = np.flatnonzero(keys < kth)
+            candidates = np.concatenate([below, np.flatnonzero(keys == kth)[:k - len(below)]])
+        else:
+            candidates = np.arange(len(keys))
+        return candidates[np.lexsort((candidates, keys[candidates]))]
+
+    def top(self, column, k=10):
+        """The k rows with the highest values, highest first"""
+        values = self.values[column]
+        return self.frame.iloc[self._select(np.where(np.isnan(values), np.inf, -values), k)]
+
+    def bottom(self, column, k=10):
+        """The k rows with the lowest values, lowest first"""
+        values = self.values[column]
+        return self.frame.iloc[self._select(np.where(np.isnan(values), np.inf, values), k)]
+
+    def percentiles(self, column):
+        """Share of partners, in percent, whose value is at most each partner's own (NaN stays NaN)"""
+        if column not in self._percentiles:
+            values = self.values[column]
+            present = ~np.isnan(values)
+            ordered = np.sort(values[present])
+            ranks = np.full(len(values), np.nan)
+            ranks[present] = np.searchsorted(ordered, values[present], side='right') / max(len(ordered), 1) * 100
+            self._percentiles[column] = ranks
+        return self._percentiles[column]
+
+    def percentile_of(self, column, rows):
+        """Percentile ranks for a subset of rows taken from the frame (e.g. top or bottom output)"""
+        return self.percentiles(column)[self.frame.index.get_indexer(rows.index)]
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+import numpy as np
+import streamlit as st
+from data import generate_partners, generate_sales, generate_activity, generate_social_activity
+from dataset import Dataset
+from query import EXTENSIONS, PandasBackend, SQLBackend, open_backend
+from config import DATASET_REGISTRY_SIZE, SYNTHETIC_SEED, ARROW_CACHE_DIR, QUERY_BACKEND, QUERY_DB_DIR
+
+def _prune(directory, keep):
+    """Remove all but the newest keep entries (dataset directories or database files) of a cache directory"""
+    entries = [os.path.join(directory, name) for name in os.listdir(directory) if not name.startswith('.')]
+    for path in sorted(entries, key=os.path.getmtime, reverse=True)[keep:]:
+        # Files still mapped or open elsewhere stay readable until closed (and are skipped on Windows)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _mapped(dataset):
+    """The same dataset memory-mapped from ARROW_CACHE_DIR/<fingerprint>, written once per content.
+
+    Other processes serving the same data map the same files. Without an
+    ARROW_CACHE_DIR the dataset stays in memory as it is.
+    """
+    if not ARROW_CACHE_DIR:
+        return dataset
+    os.makedirs(ARROW_CACHE_DIR, exist_ok=True)
+    path = os.path.join(ARROW_CACHE_DIR, dataset.fingerprint)
+    if not os.path.isdir(path):
+        # Write aside and rename, so no process ever maps a half-written directory
+        staging = tempfile.mkdtemp(dir=ARROW_CACHE_DIR, prefix='.staging-')
+        dataset.save_arrow(staging)
+        try:
+            os.rename(staging, path)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+        _prune(ARROW_CACHE_DIR, DATASET_REGISTRY_SIZE * 2)
+    mapped = Dataset.load_arrow(path)
+    mapped.fingerprint = dataset.fingerprint
+    return mapped
+
+@st.cache_resource(max_entries=DATASET_REGISTRY_SIZE, show_spinner=False)
+def _synthetic(seed, day, num_partners):
+    seeds = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(4)]
+    partners = generate_partners(num_partners, seed=seeds[0])
+    return _mapped(Dataset(partners, generate_sales(partners, seed=seeds[1]),
+                           generate_activity(partners, seed=seeds[2]),
+                           generate_social_activity(partners, seed=seeds[3])))
+
+def synthetic_dataset(seed=SYNTHETIC_SEED, num_partners=30):
+    """Shared synthetic dataset for a seed, generated once per process and day.
+
+    Every session asking for the same seed gets the same read-only Dataset
+    object, derived structures (rollup, indexes, search) included.
+    """
+    return _synthetic(seed, date.today().isoformat(), num_partners)
+
+@st.cache_resource(max_entries=DATASET_REGISTRY_SIZE, show_spinner=False)
+def _directory(path, modified):
+    return _mapped(Dataset.load(path))
+
+def directory_dataset(path):
+    """Shared dataset loaded from a Parquet directory, loaded again once its files change"""
+    path = os.path.abspath(path)
+    modified = max((os.path.getmtime(os.path.join(root, name))
+                    for root, _, names in os.walk(path) for name in names), default=0)
+    return _directory(path, modified)
+
+@st.cache_resource(max_entries=DATASET_REGISTRY_SIZE, show_spinner=False)
+def _sql_backend(fingerprint, name, _dataset):
+    os.makedirs(QUERY_DB_DIR, exist_ok=True)
+    path = os.path.join(QUERY_DB_DIR, fingerprint + EXTENSIONS[name])
+    if not os.path.exists(path):
+        # Built aside and renamed, so no process ever opens a half-written database
+        staging = os.path.join(QUERY_DB_DIR, f".staging-{os.getpid()}-{fingerprint}{EXTENSIONS[name]}")
+        open_backend(_dataset, name, staging).con.close()
+        try:
+            os.replace(staging, path)
+        except OSError:
+            os.remove(staging)
+        # Every regenerated or appended dataset has a new fingerprint, so old databases pile up
+        _prune(QUERY_DB_DIR, DATASET_REGISTRY_SIZE * 2)
+    return SQLBackend.open(path, name)
+
+def query_backend(dataset, name=QUERY_BACKEND):
+    """Backend the dashboard's KPI queries run on for a dataset (see query.py).
+
+    SQL backends query a database file under QUERY_DB_DIR, written once per
+    dataset content and shared read-only by every session and process.
+    """
+    if name == 'pandas':
+        return PandasBackend(dataset)
+    if name not in EXTENSIONS:
+        raise ValueError(f"Unknown query backend {name!r}")
+    return _sql_backend(dataset.fingerprint, name, dataset)
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+from config import ACTIVITY_TYPES
+
+ACTIVITY_COLUMNS = [f"activity_{activity_type.lower()}" for activity_type in ACTIVITY_TYPES]
+COUNT_COLUMNS = ['sales_count', 'activity_count'] + ACTIVITY_COLUMNS + [
+    'posts', 'shares', 'reviews', 'sentiment_count', 'advocacy_count']
+SUM_COLUMNS = ['revenue', 'sentiment_sum', 'advocacy_sum']
+
+_DAY_OFFSET = 2**31
+
+def _day_keys(df):
+    """Pack (partner_id, day) into one sortable int64 per row"""
+    days = df['date'].to_numpy().astype('datetime64[D]').astype(np.int64) + _DAY_OFFSET
+    return (df['partner_id'].to_numpy().astype(np.int64) << 32) | days
+
+def build_daily_rollup(sales, activity, social):
+    """Materialize one row per partner and day holding every additive KPI.
+
+    Revenue, activity counts by type, posts, shares and reviews are plain sums.
+    Sentiment and advocacy are kept as sum and count pairs so averages over any
+    set of partners or days can be rebuilt exactly. Rows come out sorted by
+    partner_id, then date.
+    """
+    sales_keys, activity_keys, social_keys = _day_keys(sales), _day_keys(activity), _day_keys(social)
+    keys, slots = np.unique(np.concatenate([sales_keys, activity_keys, social_keys]), return_inverse=True)
+    sales_slot, activity_slot, social_slot = np.split(
+        slots.ravel(), [len(sales_keys), len(sales_keys) + len(activity_keys)])
+    size = len(keys)
+
+    def total(slot, weights=None):
+        # Counts are stored as int32 straight away, so no float64 copy outlives this call
+        sums = np.bincount(slot, weights=weights, minlength=size)
+        return sums if weights is not None else sums.astype(np.int32)
+
+    rollup = {
+        'partner_id': (keys >> 32).astype(np.int32),
+        'date': ((keys & 0xFFFFFFFF) - _DAY_OFFSET).astype('datetime64[D]').astype('datetime64[ns]'),
+        'revenue': total(sales_slot, sales['revenue'].to_numpy()),
+        'sales_count': total(sales_slot),
+        'activity_count': total(activity_slot),
+    }
+    type_codes = pd.Categorical(activity['activity_type'], categories=ACTIVITY_TYPES).codes
+    for code, column in enumerate(ACTIVITY_COLUMNS):
+        rollup[column] = total(activity_slot[type_codes == code])
+    for column in ['posts', 'shares', 'reviews']:
+        rollup[column] = total(social_slot, social[column].to_numpy()).astype(np.int32)
+    sentiment = social['sentiment'].to_numpy(dtype=float)
+    advocacy = social['advocacy_score'].to_numpy(dtype=float)
+    rollup['sentiment_sum'] = total(social_slot[~np.isnan(sentiment)], sentiment[~np.isnan(sentiment)])
+    rollup['sentiment_count'] = total(social_slot[~np.isnan(sentiment)])
+    rollup['advocacy_sum'] = total(social_slot[~np.isnan(advocacy)], advocacy[~np.isnan(advocacy)])
+    rollup['advocacy_count'] = total(social_slot[~np.isnan(advocacy)])
+
+    # The columns are fresh arrays, so the frame can take them over without a copy
+    return pd.DataFrame(rollup, copy=False)
+
+def partner_totals(rollup):
+    """Sum the rollup over all days, one row per partner indexed by partner_id"""
+    return rollup.groupby('partner_id')[SUM_COLUMNS + COUNT_COLUMNS].sum()
+
+def merge_rollups(rollup, delta):
+    """Fold the rollup of newly arrived rows into an existing rollup.
+
+    Partner-days present in both are added up, the rest of delta is inserted in
+    key order, so the result is what build_daily_rollup returns for all rows
+    together. Only delta is looked up in the existing rows, which are copied
+    once into place and never regrouped.
+    """
+    keys, delta_keys = _day_keys(rollup), _day_keys(delta)
+    slot = np.minimum(np.searchsorted(keys, delta_keys), max(len(keys) - 1, 0))
+    existing = (keys[slot] == delta_keys) if len(keys) else np.zeros(len(delta_keys), dtype=bool)
+    # Output positions of the inserted rows and of the existing ones around them
+    size = len(keys) + int((~existing).sum())
+    inserted = np.searchsorted(keys, delta_keys[~existing]) + np.arange(size - len(keys))
+    kept = np.ones(size, dtype=bool)
+    kept[inserted] = False
+    updated = np.flatnonzero(kept)[slot[existing]]
+    merged = {}
+    for column in rollup.columns:
+        values = np.empty(size, dtype=rollup[column].dtype)
+        values[kept] = rollup[column].to_numpy()
+        values[inserted] = delta[column].to_numpy()[~existing]
+        if column in SUM_COLUMNS or column in COUNT_COLUMNS:
+            # Keys are unique on both sides, so each existing row is added to at most once
+            values[updated] += delta[column].to_numpy()[existing].astype(values.dtype)
+        merged[column] = values
+    return pd.DataFrame(merged, copy=False)
+
+def merge_totals(partner_kpis, delta_kpis):
+    """Add per-partner totals of new rows (partner_totals of a delta) to existing ones"""
+    index = partner_kpis.index.union(delta_kpis.index)
+    merged = partner_kpis.reindex(index, fill_value=0)
+    return merged + delta_kpis.reindex(index, fill_value=0).astype(merged.dtypes)
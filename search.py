@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+# Names are indexed on their first MAX_INDEXED bytes; substring queries scan longer names in full
+MAX_INDEXED = 48
+# Trigrams found in more than this share of names (and over 1,000 of them) say little
+# and are skipped by fuzzy matching
+COMMON_TRIGRAM_SHARE = 0.05
+# Share of the query's trigrams a name must hold to count as a fuzzy match
+MIN_FUZZY_SCORE = 0.4
+
+def _encode(values):
+    """Lower-case UTF-8 bytes of every value as a fixed-width bytes array"""
+    return np.array(pd.Series(values, dtype=object).astype(str).str.lower().str.encode('utf-8').tolist(), dtype=bytes)
+
+def _query(text):
+    return text.strip().lower().encode('utf-8')
+
+def _first_of_runs(values):
+    """Mask of the first element of every run of equal values in a sorted array"""
+    return np.concatenate([[True], values[1:] != values[:-1]]) if len(values) else np.zeros(0, dtype=bool)
+
+def _trigrams(encoded):
+    """Row and 24-bit code of every byte trigram of a fixed-width bytes array"""
+    width = encoded.dtype.itemsize
+    if width < 3 or not len(encoded):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+    raw = encoded.view(np.uint8).reshape(len(encoded), width)[:, :MAX_INDEXED].astype(np.int32)
+    codes = (raw[:, :-2] << 16) | (raw[:, 1:-1] << 8) | raw[:, 2:]
+    # Names are NUL-padded, so a trigram exists wherever its last byte is set
+    rows, _ = np.nonzero(raw[:, 2:])
+    return rows, codes[raw[:, 2:] != 0]
+
+class SearchIndex:
+    """Prefix, substring and typo-tolerant lookup of partners by name or id.
+
+    Names are kept lower-cased as UTF-8 bytes, once in row order and once sorted
+    so a prefix is a binary search. A trigram inverted index in CSR form (one
+    sorted code array, offsets and row postings) narrows substring queries to
+    the rows holding the query's rarest trigram and ranks fuzzy candidates by
+    how many trigrams they share with the query. Results are row positions of
+    the partners frame the index was built from.
+    """
+
+    def __init__(self, partners):
+        self.names = _encode(partners['name'])
+        self.name_order = np.argsort(self.names, kind='stable')
+        self.sorted_names = self.names[self.name_order]
+        self.ids = _encode(partners['partner_id'])
+        self.id_order = np.argsort(self.ids, kind='stable')
+        self.sorted_ids = self.ids[self.id_order]
+
+        # Padding adds word-boundary trigrams, which keep short typos matchable
+        rows, codes = _trigrams(_encode(' ' + partners['name'].astype(str) + ' '))
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        starts = np.flatnonzero(_first_of_runs(codes))
+        self.gram_codes = codes[starts]
+        self.gram_offsets = np.append(starts, len(codes))
+        self.gram_rows = rows[order].astype(np.int32)
+        self.gram_counts = np.bincount(rows, minlength=len(self.names))
+        # Names whose padded form runs past MAX_INDEXED bytes have trigrams the index does not hold
+        self.long_rows = np.flatnonzero(np.char.str_len(self.names) + 2 > MAX_INDEXED)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _postings(self, code):
+        slot = np.searchsorted(self.gram_codes, code)
+        if slot == len(self.gram_codes) or self.gram_codes[slot] != code:
+            return self.gram_rows[:0]
+        return self.gram_rows[self.gram_offsets[slot]:self.gram_offsets[slot + 1]]
+
+    @staticmethod
+    def _prefix(sorted_values, order, query):
+        start = np.searchsorted(sorted_values, query, side='left')
+        stop = np.searchsorted(sorted_values, query + b'\xff', side='left')
+        return order[start:stop]
+
+    def _substring(self, query, limit=None, mask=None):
+        """Rows whose name contains query in row order, stopping once limit are found"""
+        grams = _trigrams(np.array([query]))[1]
+        if not len(grams):
+            # Too short for a trigram: scan every name
+            candidates = np.arange(len(self.names))
+        else:
+            # Only names holding every trigram of the query can contain it; start from the rarest
+            postings = sorted((self._postings(code) for code in np.unique(grams)), key=len)
+            candidates = postings[0]
+            # With a limit, checking the rarest postings chunk by chunk is cheaper than intersecting
+            for rows in postings[1:] if limit is None else ():
+                if len(candidates) <= 256:
+                    break
+                # Postings are sorted, so membership is a binary search per candidate
+                slot = np.minimum(np.searchsorted(rows, candidates), len(rows) - 1)
+                candidates = candidates[rows[slot] == candidates]
+            if len(self.long_rows):
+                # The query may sit past the indexed prefix of a long name
+                candidates = np.union1d(candidates, self.long_rows)
+        chunk = len(candidates) if limit is None else max(4 * limit, 4096)
+        found, total = [], 0
+        for start in range(0, len(candidates), max(chunk, 1)):
+            rows = candidates[start:start + chunk]
+            # A name repeating a trigram appears more than once in its posting
+            rows = rows[_first_of_runs(rows)]
+            if mask is not None:
+                rows = rows[mask[rows]]
+            found.append(rows[np.char.find(self.names[rows], query) >= 0])
+            total += len(found[-1])
+            if limit is not None and total >= limit:
+                break
+        return np.concatenate(found) if found else candidates[:0]
+
+    def _fuzzy(self, query):
+        """Rows ranked by trigram overlap with query, best first"""
+        grams = np.unique(_trigrams(np.array([b' ' + query + b' ']))[1])
+        postings = [self._postings(code) for code in grams]
+        common = max(COMMON_TRIGRAM_SHARE * len(self.names), 1000)
+        informative = [rows for rows in postings if len(rows) <= common]
+        if not informative:
+            informative = postings
+        if not grams.size or not sum(len(rows) for rows in informative):
+            return np.empty(0, dtype=np.int64)
+        rows, shared = np.unique(np.concatenate(informative), return_counts=True)
+        # Share of the looked-up trigrams each name holds; shorter names win ties
+        score = shared / len(informative)
+        keep = score >= MIN_FUZZY_SCORE
+        rows, score = rows[keep], score[keep]
+        return rows[np.lexsort((self.gram_counts[rows], -score))]
+
+    def search(self, query, limit=50, mask=None, fuzzy=True):
+        """Best matches for query as row positions, at most limit of them.
+
+        Id prefix matches come first, then names starting with the query, then
+        names containing it. Only when none of those match are names within a
+        few typos returned. mask, a boolean array over the rows, keeps only
+        allowed rows.
+        """
+        query = _query(query)
+        if not query:
+            return np.empty(0, dtype=np.int64)
+        found = []
+        total = 0
+
+        def take(rows):
+            nonlocal total
+            if mask is not None:
+                rows = rows[mask[rows]]
+            # A stage never needs more than limit rows of its own
+            found.append(rows[:limit])
+            total += len(rows)
+            return total >= limit
+
+        if query.isdigit() and take(self._prefix(self.sorted_ids, self.id_order, query)):
+            return self._ranked(found, limit)
+        if take(self._prefix(self.sorted_names, self.name_order, query)):
+            return self._ranked(found, limit)
+        if len(query) >= 3 or len(self.names) <= 100_000:
+            if take(self._substring(query, limit, mask)):
+                return self._ranked(found, limit)
+        if fuzzy and not total and len(query) >= 3:
+            take(self._fuzzy(query))
+        return self._ranked(found, limit)
+
+    @staticmethod
+    def _ranked(found, limit):
+        rows = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+        _, first = np.unique(rows, return_index=True)
+        return rows[np.sort(first)][:limit]
+
+    def matches(self, query, fuzzy=True):
+        """Every row matching query, in row order, for filtering.
+
+        A row matches when its name contains the query or its id starts with it.
+        When nothing matches, the typo-tolerant matches are returned instead.
+        """
+        query = _query(query)
+        if not query:
+            return np.arange(len(self.names))
+        rows = self._substring(query)
+        if query.isdigit():
+            hit = np.zeros(len(self.names), dtype=bool)
+            hit[rows] = True
+            hit[self._prefix(self.sorted_ids, self.id_order, query)] = True
+            rows = np.flatnonzero(hit)
+        if not len(rows) and fuzzy and len(query) >= 3:
+            rows = np.sort(self._fuzzy(query))
+        return rows
@@ -1,114 +1,201 @@
-import networkx as nx
 from pyvis.network import Network
-import tempfile
 import os
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
+import numpy as np
 import pandas as pd
-from config import COLOR_MAP, SOCIAL_METRICS
+from config import COLOR_MAP, SOCIAL_METRICS, ACTIVITY_TYPES, CHART_POINT_BUDGET, WEBGL_THRESHOLD
+from downsample import downsample, bucket_sums
+from rollup import ACTIVITY_COLUMNS
+
+NETWORK_OPTIONS = """
+const options = {
+  "physics": {
+    "forceAtlas2Based": {
+      "gravitationalConstant": -50,
+      "springLength": 100,
+      "avoidOverlap": 1
+    },
+    "maxVelocity": 50,
+    "minVelocity": 0.75,
+    "solver": "forceAtlas2Based"
+  },
+  "nodes": {
+    "shape": "dot",
+    "borderWidth": 1,
+    "borderWidthSelected": 4
+  },
+  "edges": {
+    "arrows": "to"
+  },
+  "interaction": {
+    "hover": true,
+    "tooltipDelay": 200
+  }
+}
+"""
+
+# Used when node positions come from layout.compute_layout: nothing moves in the browser
+STATIC_NETWORK_OPTIONS = """
+const options = {
+  "physics": {
+    "enabled": false
+  },
+  "nodes": {
+    "shape": "dot",
+    "borderWidth": 1,
+    "borderWidthSelected": 4
+  },
+  "edges": {
+    "arrows": "to",
+    "smooth": false
+  },
+  "interaction": {
+    "hover": true,
+    "tooltipDelay": 200,
+    "hideEdgesOnDrag": true
+  }
+}
+"""
+
+# Tooltip templates live next to pyvis's own helpers and are inlined into every page
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lib', 'bindings', 'utils.js'), encoding='utf-8') as f:
+    BINDINGS_JS = f.read()
+
+def network_view(filtered_df, partners, hierarchy, node_budget, expanded=()):
+    """Rows to draw on the network tab, collapsing subtrees once there are more than node_budget.
+
+    Collapsed subtrees come back as their top partner's row with cluster_size set
+    to the number of visible partners it stands for and cluster_revenue to their
+    summed total_revenue. Children bundled by Hierarchy.level_of_detail get
+    negative ids. Partners in expanded are always drawn individually.
+    """
+    if len(filtered_df) <= node_budget:
+        return filtered_df.assign(cluster_size=0, cluster_revenue=0.0)
+
+    visible = np.zeros(len(hierarchy.ids), dtype=bool)
+    positions = hierarchy.positions(filtered_df['partner_id'])
+    visible[positions[positions >= 0]] = True
+    items = hierarchy.level_of_detail(visible, partners['total_revenue'], node_budget, expanded)
+
+    drawn = items[items['kind'] != 'rest']
+    view = partners.iloc[hierarchy.positions(drawn['partner_id'])].reset_index(drop=True)
+    view['cluster_size'] = np.where(drawn['kind'] == 'cluster', drawn['count'], 0)
+    view['cluster_revenue'] = drawn['weight'].to_numpy()
+
+    rest = items[items['kind'] == 'rest']
+    if len(rest):
+        bundles = pd.DataFrame({
+            'partner_id': -np.arange(1, len(rest) + 1),
+            'name': [f"{count:,} more partners" for count in rest['count']],
+            'parent_id': pd.array(rest['partner_id'].where(rest['partner_id'] > 0), dtype='Int64'),
+            'cluster_size': rest['count'].to_numpy(),
+            'cluster_revenue': rest['weight'].to_numpy()
+        })
+        view = pd.concat([view, bundles], ignore_index=True)
+    return view
+
+def build_network(filtered_df, selected_node=None, positions=None):
+    """Build the pyvis network for the filtered partners in linear time.
+
+    Node attributes and edges are computed column-wise and handed to pyvis as
+    ready-made node and edge dicts; Network.add_node/add_edge check membership
+    against a list and would make construction quadratic again. Rows carrying a
+    cluster_size (see network_view) are drawn as cluster nodes. With positions
+    (layout.compute_layout on the same rows) the nodes are pinned and physics is switched off.
+    """
+    ids = filtered_df['partner_id'].to_numpy(dtype=np.int64)
+    cluster_size = (filtered_df['cluster_size'].to_numpy(dtype=np.int64) if 'cluster_size' in filtered_df
+                    else np.zeros(len(ids), dtype=np.int64))
+    clustered = cluster_size > 0
+
+    # Size nodes by revenue for visual importance; clusters by their summed revenue
+    sizes = np.clip((filtered_df['total_revenue'].fillna(0).to_numpy() / 2000).astype(np.int64), 20, 50)
+    if clustered.any():
+        cluster_revenue = filtered_df['cluster_revenue'].to_numpy(dtype=float)
+        sizes = np.where(clustered, np.clip(20 + 8 * np.log10(1 + cluster_revenue / 2000), 20, 80).astype(np.int64), sizes)
+    colors = filtered_df['level'].astype(str).map(COLOR_MAP).fillna('#cccccc')
+
+    # Highlight selected node if any
+    selected = ids == selected_node if selected_node is not None else np.zeros(len(ids), dtype=bool)
+
+    # Tooltip fields travel as compact arrays and are rendered by partnerTooltip in the browser
+    labels = filtered_df['name'].tolist()
+    shapes = [None] * len(ids)
+    details = [None] * len(ids)
+    for i in np.flatnonzero(clustered).tolist():
+        if ids[i] > 0:
+            labels[i] = f"{labels[i]} [{cluster_size[i]:,}]"
+            shapes[i] = 'diamond'
+        else:
+            shapes[i] = 'square'
+        details[i] = ('c', [int(cluster_size[i]), round(float(cluster_revenue[i]), 2)])
+    partner_rows = filtered_df[~clustered]
+    for i, row in zip(np.flatnonzero(~clustered).tolist(), zip(
+            partner_rows['level'].astype(str), partner_rows['status'].astype(str),
+            partner_rows['join_date'].dt.strftime('%Y-%m-%d'), partner_rows['total_revenue'].round(2),
+            partner_rows['advocacy_score'].astype(int), partner_rows['sentiment'].round(2),
+            partner_rows['posts'].astype(int), partner_rows['shares'].astype(int),
+            partner_rows['engagement'].astype(int))):
+        details[i] = ('d', list(row))
+
+    nodes = []
+    for node, label, shape, detail, color, size, is_selected in zip(
+            ids.tolist(), labels, shapes, details, colors.tolist(), sizes.tolist(), selected.tolist()):
+        # Shape and border defaults come from the network options
+        item = {'id': node, 'label': label, 'color': color, 'size': size, detail[0]: detail[1]}
+        if shape:
+            item['shape'] = shape
+        if is_selected:
+            item['borderWidth'] = 3
+            item['color'] = {'background': color, 'border': "#FF0000"}
+        nodes.append(item)
+
+    # Edges (relationships) whose parent is also visible, found with one hash join
+    parents = filtered_df['parent_id'].astype('Float64').fillna(-1).to_numpy(dtype=np.int64)
+    has_parent = np.isin(parents, ids)
+    edges = [{'from': source, 'to': target}
+             for source, target in zip(parents[has_parent].tolist(), ids[has_parent].tolist())]
+
+    if positions is not None:
+        placed = positions.reindex(ids).fillna(0.0)
+        for node, x, y in zip(nodes, placed['x'].tolist(), placed['y'].tolist()):
+            node['x'], node['y'] = x, y
 
-def render_network_graph(filtered_df, selected_node=None):
-    G = nx.DiGraph()
-    
-    # Add nodes with all partner attributes
-    for _, row in filtered_df.iterrows():
-        # Store all row data for detailed view
-        G.add_node(row['partner_id'], 
-                 label=row['name'], 
-                 level=row['level'], 
-                 join_date=row['join_date'],
-                 status=row['status'],
-                 posts=row['posts'],
-                 shares=row['shares'],
-                 sentiment=row['sentiment'],
-                 advocacy_score=row['advocacy_score'],
-                 engagement=row['engagement'],
-                 total_revenue=row['total_revenue']
-                 )
-    
-    # Add edges (relationships)
-    for _, row in filtered_df.iterrows():
-        if row['parent_id'] and row['parent_id'] in filtered_df['partner_id'].values:
-            G.add_edge(row['parent_id'], row['partner_id'])
-    
     # Create the network visualization
     net = Network(height="600px", width="100%", directed=True, notebook=False)
-    
+
     # Set network options for better visualization
-    net.set_options("""
-    const options = {
-      "physics": {
-        "forceAtlas2Based": {
-          "gravitationalConstant": -50,
-          "springLength": 100,
-          "avoidOverlap": 1
-        },
-        "maxVelocity": 50,
-        "minVelocity": 0.75,
-        "solver": "forceAtlas2Based"
-      },
-      "interaction": {
-        "hover": true,
-        "tooltipDelay": 200
-      }
-    }
-    """)
-    
-    # Add nodes to network with enhanced tooltips
-    for node, data in G.nodes(data=True):
-        # Size nodes by revenue for visual importance
-        size = min(50, max(20, int(data['total_revenue'] / 2000)))
-        
-        # Create a detailed HTML tooltip
-        tooltip = f"""
-        <div style='font-family:Arial; max-width:300px; padding:10px; background:#f9f9f9; border:1px solid #ddd;'>
-            <h3 style='margin:0 0 10px 0'>{data['label']}</h3>
-            <table style='width:100%; border-collapse:collapse;'>
-                <tr><td><b>Level:</b></td><td>{data['level']}</td></tr>
-                <tr><td><b>Status:</b></td><td>{data['status']}</td></tr>
-                <tr><td><b>Join Date:</b></td><td>{data['join_date']}</td></tr>
-                <tr><td><b>Revenue:</b></td><td>${data['total_revenue']:,.2f}</td></tr>
-                <tr><td><b>Advocacy Score:</b></td><td>{data['advocacy_score']}/100</td></tr>
-                <tr><td><b>Sentiment:</b></td><td>{data['sentiment']}</td></tr>
-                <tr><td><b>Posts:</b></td><td>{data['posts']}</td></tr>
-                <tr><td><b>Shares:</b></td><td>{data['shares']}</td></tr>
-                <tr><td><b>Engagement:</b></td><td>{data['engagement']}/100</td></tr>
-            </table>
-        </div>
-        """
-        
-        # Highlight selected node if any
-        border_width = 3 if node == selected_node else 1
-        border_color = "#FF0000" if node == selected_node else "#000000"
-        
-        net.add_node(
-            node,
-            label=data['label'],
-            title=tooltip,
-            color=COLOR_MAP.get(data['level'], '#cccccc'),
-            size=size,
-            borderWidth=border_width,
-            borderWidthSelected=4,
-            borderColor=border_color
-        )
-    
-    # Add edges to the network
-    for source, target in G.edges():
-        net.add_edge(source, target, arrows='to')
-    
-    # Save and display the network
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".html") as tmp_file:
-        net.save_graph(tmp_file.name)
-        tmp_path = tmp_file.name
-    
-    # Display graph in Streamlit
-    st.components.v1.html(open(tmp_path, 'r', encoding='utf-8').read(), height=650)
-    os.remove(tmp_path)
+    net.set_options(NETWORK_OPTIONS if positions is None else STATIC_NETWORK_OPTIONS)
+
+    net.nodes = nodes
+    net.node_ids = ids.tolist()
+    net.node_map = {node['id']: node for node in nodes}
+    net.edges = edges
+    return net
 
-def display_partner_details(partner_df, sales_df, activity_df, social_df, partner_id):
-    """Display detailed information about a selected partner"""
-    partner = partner_df[partner_df['partner_id'] == partner_id].iloc[0]
+def network_html(filtered_df, selected_node=None, positions=None):
+    """Self-contained page for the network, generated in memory.
+
+    The tooltip helpers are inlined because the Streamlit iframe cannot load
+    pyvis's relative lib/ script, and run once the graph is drawn.
+    """
+    html = build_network(filtered_df, selected_node, positions).generate_html()
+    html = html.replace('<script src="lib/bindings/utils.js"></script>', f"<script>{BINDINGS_JS}</script>", 1)
+    return html.replace('</body>', "<script>applyTooltips(nodes);</script>\n</body>", 1)
+
+def render_network_graph(html):
+    st.components.v1.html(html, height=650)
+
+def display_partner_details(index, hierarchy, downline, partner_id):
+    """Display detailed information about a selected partner.
+
+    index maps each table name to its PartnerIndex, so every lookup below is a
+    slice rather than a scan of the whole table. hierarchy and downline
+    (hierarchy.downline_totals) supply the partner's position and subtree totals.
+    """
+    partner = index['partners'].rows(partner_id).iloc[0]
     
     # Main metrics in columns
     col1, col2, col3, col4 = st.columns(4)
@@ -130,7 +217,7 @@ def display_partner_details(partner_df, sales_df, activity_df, social_df, partne
         | --- | --- |
         | Partner ID | {partner['partner_id']} |
         | Level | {partner['level']} |
-        | Join Date | {partner['join_date']} |
+        | Join Date | {partner['join_date']:%Y-%m-%d} |
         | Status | {partner['status']} |
         | Total Revenue | ${partner['total_revenue']:,.2f} |
         """)
@@ -145,15 +232,15 @@ def display_partner_details(partner_df, sales_df, activity_df, social_df, partne
     
     # Tab 2: Revenue
     with tabs[1]:
-        partner_sales = sales_df[sales_df['partner_id'] == partner_id].copy()
+        partner_sales = index['sales'].rows(partner_id)
         
         if not partner_sales.empty:
-            # Show revenue over time
-            partner_sales['date'] = pd.to_datetime(partner_sales['date'])
-            revenue_by_date = partner_sales.groupby('date')['revenue'].sum().reset_index()
+            # Show revenue over time, read from the daily rollup
+            partner_days = index['rollup'].rows(partner_id)
+            revenue_by_date = partner_days.loc[partner_days['sales_count'] > 0, ['date', 'revenue']]
             
-            fig = px.line(revenue_by_date, x='date', y='revenue', 
-                         title=f"{partner['name']} Revenue Over Time")
+            fig = create_time_series_charts(revenue_by_date, 'date', 'revenue',
+                                            f"{partner['name']} Revenue Over Time")
             st.plotly_chart(fig, use_container_width=True)
             
             # Show recent transactions
@@ -167,24 +254,27 @@ def display_partner_details(partner_df, sales_df, activity_df, social_df, partne
     
     # Tab 3: Activity
     with tabs[2]:
-        partner_activity = activity_df[activity_df['partner_id'] == partner_id].copy()
+        partner_activity = index['activity'].rows(partner_id)
         
         if not partner_activity.empty:
             # Activity breakdown
             st.subheader("Activity Breakdown")
-            activity_counts = partner_activity['activity_type'].value_counts().reset_index()
-            activity_counts.columns = ['activity_type', 'count']
+            partner_days = index['rollup'].rows(partner_id)
+            activity_counts = pd.DataFrame({
+                'activity_type': ACTIVITY_TYPES,
+                'count': partner_days[ACTIVITY_COLUMNS].sum().to_numpy()
+            }).sort_values('count', ascending=False)
             
             fig = px.bar(activity_counts, x='activity_type', y='count',
                        title=f"{partner['name']} Activity Breakdown")
             st.plotly_chart(fig, use_container_width=True)
             
             # Activity timeline
-            partner_activity['date'] = pd.to_datetime(partner_activity['date'])
-            activity_timeline = partner_activity.groupby('date').size().reset_index(name='activities')
+            activity_timeline = (partner_days.loc[partner_days['activity_count'] > 0, ['date', 'activity_count']]
+                                 .rename(columns={'activity_count': 'activities'}))
             
-            fig = px.line(activity_timeline, x='date', y='activities',
-                        title=f"{partner['name']} Activity Timeline")
+            fig = create_time_series_charts(activity_timeline, 'date', 'activities',
+                                            f"{partner['name']} Activity Timeline")
             st.plotly_chart(fig, use_container_width=True)
             
             # Recent activities
@@ -198,32 +288,27 @@ def display_partner_details(partner_df, sales_df, activity_df, social_df, partne
     
     # Tab 4: Social Metrics
     with tabs[3]:
-        partner_social = social_df[social_df['partner_id'] == partner_id].copy()
+        partner_social = index['social'].rows(partner_id)
         
         if not partner_social.empty:
-            # Convert to datetime for time series
-            partner_social['date'] = pd.to_datetime(partner_social['date'])
-            
             # Sentiment over time
             st.subheader("Sentiment Over Time")
-            fig = px.line(partner_social, x='date', y='sentiment',
-                        title=f"{partner['name']} Sentiment Trend")
+            fig = create_time_series_charts(partner_social, 'date', 'sentiment',
+                                            f"{partner['name']} Sentiment Trend")
             fig.add_hline(y=0, line_dash="dash", line_color="gray")
             st.plotly_chart(fig, use_container_width=True)
             
             # Posts and shares over time
             st.subheader("Social Media Activity")
-            fig = go.Figure()
-            fig.add_trace(go.Bar(x=partner_social['date'], y=partner_social['posts'], name='Posts'))
-            fig.add_trace(go.Bar(x=partner_social['date'], y=partner_social['shares'], name='Shares'))
-            fig.update_layout(title=f"{partner['name']} Social Media Activity",
-                            barmode='stack', xaxis_title='Date', yaxis_title='Count')
+            fig = create_time_series_charts(partner_social.rename(columns={'posts': 'Posts', 'shares': 'Shares'}),
+                                            'date', ['Posts', 'Shares'], f"{partner['name']} Social Media Activity",
+                                            kind='bar', xaxis_title='Date', yaxis_title='Count')
             st.plotly_chart(fig, use_container_width=True)
             
             # Advocacy score over time
             st.subheader("Advocacy Score")
-            fig = px.line(partner_social, x='date', y='advocacy_score',
-                        title=f"{partner['name']} Advocacy Score Trend")
+            fig = create_time_series_charts(partner_social, 'date', 'advocacy_score',
+                                            f"{partner['name']} Advocacy Score Trend")
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No social data available for this partner.")
@@ -232,9 +317,23 @@ def display_partner_details(partner_df, sales_df, activity_df, social_df, partne
     with tabs[4]:
         st.subheader("Hierarchical Position")
         
+        # Whole-downline totals, one range sum each
+        partner_downline = downline.loc[partner_id]
+        downline_cols = st.columns(4)
+        downline_cols[0].metric("Depth", hierarchy.depth_of(partner_id))
+        downline_cols[1].metric("Downline Partners", f"{int(partner_downline['downline_size']):,}")
+        downline_cols[2].metric("Downline Revenue", f"${partner_downline['downline_revenue']:,.2f}")
+        downline_cols[3].metric("Downline Activities", f"{int(partner_downline['downline_activity']):,}")
+        
+        # Path from the root down to this partner
+        path = hierarchy.ancestors(partner_id)
+        if path:
+            path_names = index['partners'].rows_for(path).set_index('partner_id')['name']
+            st.markdown("**Path:** " + " → ".join([path_names[p] for p in path] + [partner['name']]))
+        
         # Show parent information if exists
         if not pd.isna(partner['parent_id']):
-            parent = partner_df[partner_df['partner_id'] == partner['parent_id']].iloc[0]
+            parent = index['partners'].rows(partner['parent_id']).iloc[0]
             st.markdown(f"### Parent: {parent['name']}")
             st.markdown(f"""
             | Attribute | Value |
@@ -247,17 +346,53 @@ def display_partner_details(partner_df, sales_df, activity_df, social_df, partne
             st.markdown("### This partner is at the top of the hierarchy")
         
         # Show children information
-        children = partner_df[partner_df['parent_id'] == partner_id]
+        children = index['partners'].rows_for(hierarchy.children(partner_id))
         if not children.empty:
             st.markdown(f"### Children ({len(children)})")
             st.dataframe(children[['partner_id', 'name', 'level', 'status', 'total_revenue']])
         else:
             st.markdown("### This partner has no children")
 
-def create_time_series_charts(data_df, date_col, value_col, title, color=None):
-    """Helper function to create time series charts"""
-    if data_df.empty:
-        return None
+def create_time_series_charts(data_df, date_col, value_col, title, color=None, kind='line',
+                              xaxis_title=None, yaxis_title=None, budget=CHART_POINT_BUDGET, method='lttb'):
+    """Time-series figure whose size stays bounded however long the history is.
+
+    value_col is a column or a list of columns, one trace each, and color splits
+    the rows into one trace per value of that column. Lines are downsampled to
+    budget points per trace (downsample.downsample, LTTB by default) and drawn
+    with WebGL once the figure holds more than WEBGL_THRESHOLD points. With
+    kind='bar' the columns are stacked bars, summed into at most budget buckets.
+    """
+    value_cols = [value_col] if isinstance(value_col, str) else list(value_col)
+    groups = [(None, data_df)] if color is None else data_df.groupby(color, observed=True, sort=False)
+    series = []
+    for group, df in groups:
+        if not df[date_col].is_monotonic_increasing:
+            df = df.sort_values(date_col, kind='stable')
+        if kind == 'bar':
+            x, sums = bucket_sums(df[date_col].to_numpy(), df[value_cols].to_numpy(dtype=float), budget)
+            series += [(group, column, x, sums[:, i]) for i, column in enumerate(value_cols)]
+            continue
+        for column in value_cols:
+            points = df[[date_col, column]].dropna()
+            x, y = points[date_col].to_numpy(), points[column].to_numpy(dtype=float)
+            kept = downsample(x, y, budget, method)
+            series.append((group, column, x[kept], y[kept]))
+    
+    def name(group, column):
+        if group is None:
+            return column
+        return str(group) if len(value_cols) == 1 else f"{group} {column}"
+    
+    if kind == 'bar':
+        traces = [go.Bar(x=x, y=y, name=name(group, column)) for group, column, x, y in series]
+    else:
+        # SVG slows down with every point it draws; WebGL does not
+        trace = go.Scattergl if sum(len(x) for _, _, x, _ in series) > WEBGL_THRESHOLD else go.Scatter
+        traces = [trace(x=x, y=y, mode='lines', name=name(group, column)) for group, column, x, y in series]
     
-    fig = px.line(data_df, x=date_col, y=value_col, title=title, color=color)
+    fig = go.Figure(traces)
+    fig.update_layout(title=title, xaxis_title=xaxis_title or date_col,
+                      yaxis_title=yaxis_title or (value_cols[0] if len(value_cols) == 1 else None),
+                      showlegend=len(traces) > 1, barmode='stack' if kind == 'bar' else None)
     return fig